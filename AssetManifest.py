@@ -0,0 +1,81 @@
+#                                     Summary:
+#
+# This class maps static files (stylesheets and images) to filenames that contain a hash of
+# the file's contents, e.g. "css/style.css" -> "css/style.1a2b3c4d5e6f7a8b.css". A file's
+# hashed name changes whenever its contents change, so browsers can keep the file forever.
+# The static folders are read once when the manifest is created.
+#
+#
+#
+#                                     Data Members:
+#
+# staticPath, hashedNames, assetNames, lock
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", adds every file in the given static folders.
+#
+# "addAsset": Hashes one file and adds it to the manifest (used for uploaded images).
+#
+# "getHashedName": Returns the hashed filename of a static file.
+#
+# "getAssetName": Returns the static file a hashed filename belongs to.
+#
+# "getURL": Returns the URL a page should use for a static file.
+
+import hashlib
+import os
+import threading
+from typing import Dict, List
+from flask import url_for
+
+class AssetManifest:
+    # Number of hex digits of the SHA-256 hash kept in hashed filenames
+    hashLength = 16
+
+    # folders are the folders inside staticPath to add (e.g. "css/"), including their subfolders
+    def __init__(self, staticPath: str, folders: List[str]):
+        self.staticPath = staticPath
+        # Static file -> hashed filename, and the reverse (both relative to staticPath)
+        self.hashedNames: Dict[str, str] = {}
+        self.assetNames: Dict[str, str] = {}
+        # Uploaded images are added from several Flask threads
+        self.lock = threading.Lock()
+        for folder in folders:
+            for dirPath, dirNames, fileNames in os.walk(staticPath + folder):
+                for fileName in fileNames:
+                    assetName = os.path.relpath(os.path.join(dirPath, fileName), staticPath).replace(os.sep, '/')
+                    self.addAsset(assetName)
+
+    # Hash the contents of a static file and add it to the manifest
+    # The hash goes before the last extension: "images/events/Event1.jpg0" -> "images/events/Event1.<hash>.jpg0"
+    def addAsset(self, assetName: str) -> str:
+        with open(self.staticPath + assetName, 'rb') as inFile:
+            digest = hashlib.sha256(inFile.read()).hexdigest()[:self.hashLength]
+        base, extension = os.path.splitext(assetName)
+        hashedName = base + '.' + digest + extension
+        with self.lock:
+            oldName = self.hashedNames.get(assetName)
+            if (oldName):
+                self.assetNames.pop(oldName, None)
+            self.hashedNames[assetName] = hashedName
+            self.assetNames[hashedName] = assetName
+        return hashedName
+
+    # Returns the hashed filename of a static file (None if the file is not in the manifest)
+    def getHashedName(self, assetName: str) -> str:
+        return self.hashedNames.get(assetName)
+
+    # Returns the static file a hashed filename belongs to (None if not in the manifest)
+    def getAssetName(self, hashedName: str) -> str:
+        return self.assetNames.get(hashedName)
+
+    # Returns the URL of a static file, the long-lived "asset" route if it is in the manifest
+    # Files that are not in the manifest use Flask's plain static route
+    def getURL(self, assetName: str) -> str:
+        hashedName = self.hashedNames.get(assetName)
+        if (hashedName == None):
+            return url_for("static", filename=assetName)
+        return url_for("asset", filename=hashedName)
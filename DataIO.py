@@ -33,7 +33,9 @@ class DataIO:
     databasePath = "database\\"
     eventFilename = "Events.txt"
     oldEventFilename = "OldEvents.txt"
+    eventJournalFilename = "EventsJournal.txt"
     userdataFilename = "Userdata.txt"
+    sqliteFilename = "Database.db"
 
     def __init__(self):
         self.data = []
@@ -8,18 +8,27 @@
 #
 #                                      Data members:
 #
-# notifiedList, password, senderEmail, eventName, notificationType
+# notified, invited, password, senderEmail, smtpPool, outbox, environment, templates
 #
 #
 #
 #                                       Methods:
 #
-# "init": The "constructor" class, it initializes each one.
+# "init": The "constructor" class, it initializes each one. Emails are sent through a pool of
+# logged in SMTP connections (see SMTPPool) configured in database/.env:
+# SMTP_HOST, SMTP_PORT, SMTP_USE_SSL, SMTP_POOL_SIZE and SMTP_MAX_MESSAGES (messages per connection).
+# Leave PASSWORD empty to send without logging in (e.g. to a local test SMTP server).
+# Emails are not sent directly: they are added to an outbox (see EmailOutbox) in database/outbox/
+# and sent in the background by one worker per pooled connection.
 #
-# "loadNotifiedList": It creates and loads a list of notifications that have already
-# been sent out, along with handling events that are no longer active.
+# "getOutboxStats": Returns the outbox queue depth, delivery counts and delivery latency.
 #
-# "saveNotifiedList": It saves the notified list.
+# "getProjectedCompletion": Returns when the outbox is projected to be empty, at the send
+# rate limits (EMAIL_PER_SECOND, EMAIL_PER_DAY).
+#
+# "loadNotifiedList": It loads the notifications that have already been sent out,
+# along with handling events that are no longer active. The notified and invited lists are
+# kept in EmailLedgers, which append each change to their file (see EmailLedger).
 #
 # "removeNotified": If an event does not need notifications sent out,
 # it removes the event from the list
@@ -30,270 +39,234 @@
 # "oneDayUserNotification": Specifically sends an email to the user about an upcoming event,
 # provided that one has already been sent for that event.
 #
-# "oneDayNotificationMsg": Returns a value for messages sent out for the one day
-# notification.
+# "buildEventMessages": Returns the email about an event (one day or one week notification,
+# or invitation) for each user in a list. Templates are loaded once when EmailHandler is
+# created, and each event's email is rendered once with only the username changed per user.
+#
+# "sendReminderDigests": Sends the one day and one week reminders due for several events as
+# one digest email per user (emails/reminderDigest), used when EMAIL_DIGEST is True.
 
-import smtplib, ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-from flask import Flask, render_template, url_for
-from typing import List
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import escape
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
 
 
 from dataClasses.EventData import EventData
 from dataClasses.UserData import UserData
+from SMTPPool import SMTPPool
+from EmailOutbox import EmailOutbox
+from EmailLedger import EmailLedger
+from SendScheduler import SendScheduler
+from dataClasses.extras import EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_DELAY, EMAIL_MAX_RETRY_DELAY, EMAIL_PER_SECOND, EMAIL_PER_DAY
 
 class EmailHandler:
     envPath = Path("database/.env")
     emailTemplatePath = "emails\\"
     notifiedListPath = "database\\NotifiedList.txt"
     invitedListPath = "database\\InvitedList.txt"
+    outboxPath = "database/outbox/"
+    # Per day send limit left, kept next to the outbox's spool (not named .json, which the outbox reads as messages)
+    sendLimitPath = "database/outbox/sendLimit.state"
+    # Subject of each email sent about an event ({eventName} is replaced)
+    emailSubjects = {"oneDayNotification": "Reminder: {eventName} Soon!",
+                     "oneWeekNotification": "Reminder: {eventName} Tomorrow!",
+                     "sendInvitation": "Notification: You're Invited!",
+                     "reminderDigest": "Reminder: {count} Events Coming Up!"}
+    # Notified list entry and digest wording of each reminder email
+    notificationTypes = {"oneDayNotification": "one_day", "oneWeekNotification": "one_week"}
+    reminderWhen = {"oneDayNotification": "tomorrow", "oneWeekNotification": "next week"}
+    # Stands in for the username when an event's email is rendered
+    usernameMark = "\x00username\x00"
 
     def __init__(self, newHostName) -> None:
         load_dotenv(dotenv_path=self.envPath)
         self.senderEmail = os.getenv("SENDER_EMAIL")
         self.password = os.getenv("PASSWORD")
-        self.emailPort = 465
         self.hostName = newHostName
-        self.context = ssl.create_default_context()
-        # [[eventName, notificationType], ...]
-        self.notifiedList: List[List[str]] = []
-        # [[eventName, [userName, ...]], ...]
-        self.invitedList: List[List[str, List[str]]] = []
-        self.onStartup()
-    
-    # Check if files exist, make them if not
-    def onStartup(self):
-        if (not os.path.exists(self.notifiedListPath)):
-            newFile = open(self.notifiedListPath, 'w')
-            newFile.close()
-        if (not os.path.exists(self.invitedListPath)):
-            newFile = open(self.invitedListPath, 'w')
-            newFile.close()
-    
+        # Loaded once, with the same settings Flask uses (.html autoescaped, .txt not)
+        self.environment = Environment(loader=FileSystemLoader("templates"), autoescape=select_autoescape(["html"]))
+        self.templates = {emailName: (self.environment.get_template(f"emails/{emailName}.txt"),
+                                      self.environment.get_template(f"emails/{emailName}.html"))
+                          for emailName in self.emailSubjects}
+        # Logged in connections are kept open and shared by every email sent
+        self.smtpPool = SMTPPool(os.getenv("SMTP_HOST", "smtp.gmail.com"),
+                                 int(os.getenv("SMTP_PORT", "465")),
+                                 useSSL=(os.getenv("SMTP_USE_SSL", "true").lower() == "true"),
+                                 username=(self.senderEmail if self.password else None),
+                                 password=self.password,
+                                 size=int(os.getenv("SMTP_POOL_SIZE", "2")),
+                                 maxMessages=int(os.getenv("SMTP_MAX_MESSAGES", "100")))
+        # Pages only wait for the email to be written to the outbox, not for the mail server
+        # Emails are sent as fast as EMAIL_PER_SECOND and EMAIL_PER_DAY allow, events taking turns
+        # (the emails left of the day's limit are saved, so restarting does not reset it)
+        self.outbox = EmailOutbox(self.outboxPath, self.smtpPool.sendmail, self.smtpPool.size,
+                                  EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_DELAY, EMAIL_MAX_RETRY_DELAY,
+                                  SendScheduler(EMAIL_PER_SECOND, EMAIL_PER_DAY, self.sendLimitPath))
+        # Notification types ("one_day", "one_week") sent for each event
+        self.notified = EmailLedger(self.notifiedListPath)
+        # Usernames invited to each event
+        self.invited = EmailLedger(self.invitedListPath)
+
     # Call load methods
     def load(self, activeEvents: List[EventData]) -> None:
         self.loadNotifiedList(activeEvents)
         self.loadInvitedList(activeEvents)
 
-    # Load list of event notifications already sent out
+    # Load notifications already sent out, ignoring events that are not active anymore
     def loadNotifiedList(self, activeEvents: List[EventData]) -> None:
-        self.notifiedList = []
-        with open(self.notifiedListPath, 'r') as inFile:
-            for line in inFile:
-                line = line.strip().split()
-                line = [entry.replace('_', ' ') for entry in line]
-                eventName = line.pop(0)
-                notificationType = line.pop(0)
-                
-                # Ignore events that are not active anymore
-                activeEventNames = [event.getName() for event in activeEvents]
-                if (eventName in activeEventNames):
-                    self.notifiedList.append([eventName, notificationType])
-        self._saveNotifiedList()
-    
-    # Save notified list
-    def _saveNotifiedList(self) -> None:
-        with open(self.notifiedListPath, 'w') as outFile:
-            for entry in self.notifiedList:
-                line = entry
-                line = [entry.replace(' ', '_') for entry in line]
-                line = ' '.join(line)
-                print(line, file=outFile)
+        self.notified.load([event.getName() for event in activeEvents])
 
     # Remove a list of retired events from the notified list
-    # Removes all mentions of each event in list
     def removeNotified(self, events: List[EventData]) -> None:
-        for event in events:
-            eventName = event.getName()
-            for notified in self.notifiedList:
-                if (notified[0] == eventName):
-                    self.notifiedList.remove(notified)
-        self._saveNotifiedList()
-    
-    # Load list of event invitations already sent out
-    def loadInvitedList(self, activeEvents: List[EventData]) -> None:
-        self.invitedList = []
-        with open(self.invitedListPath, 'r') as inFile:
-            for line in inFile:
-                line = line.strip().split()
-                eventName = line[0]
+        self.notified.remove([event.getName() for event in events])
 
-                # Ignore events that are not active anymore
-                activeEventNames = [event.getName() for event in activeEvents]
-                if (eventName in activeEventNames):
-                    self.invitedList.append(line)
-        self._saveInvitedList()
-    
-    # Save notified list
-    def _saveInvitedList(self) -> None:
-        with open(self.invitedListPath, 'w') as outFile:
-            for entry in self.invitedList:
-                line = []
-                line.extend(entry)
-                line = ' '.join(line)
-                print(line, file=outFile)
+    # Load invitations already sent out, ignoring events that are not active anymore
+    def loadInvitedList(self, activeEvents: List[EventData]) -> None:
+        self.invited.load([event.getName() for event in activeEvents])
 
     # Remove a list of retired events from the invited list
-    # Removes all mentions of each event in list
     def removeInvited(self, events: List[EventData]) -> None:
-        for event in events:
-            eventName = event.getName()
-            for invited in self.invitedList:
-                if (invited[0] == eventName):
-                    self.invitedList.remove(invited)
-        self._saveInvitedList()
-    
+        self.invited.remove([event.getName() for event in events])
+
     # Returns list of usernames already invited to given event
-    # Returns empty list if event is not in invitedList
+    # Returns empty list if no one has been invited to the event
     def getInvited(self, eventName: str) -> List[str]:
-        for entry in self.invitedList:
-            if (eventName == entry[0]):
-                return entry[1:]
-        return []
+        return self.invited.get(eventName)
+
+    # Returns outbox queue depth, delivery counts and latency (see EmailOutbox.getStats)
+    def getOutboxStats(self) -> Dict[str, float]:
+        return self.outbox.getStats()
+
+    # Returns when the emails in the outbox, plus extraCount more, are projected to be sent
+    # at the EMAIL_PER_SECOND and EMAIL_PER_DAY limits
+    def getProjectedCompletion(self, extraCount: int=0) -> datetime:
+        return datetime.now() + timedelta(seconds=self.outbox.projectCompletion(extraCount))
 
     # Send email notifications for an event that happens the next day
     def oneDayNotification(self, event: EventData, rsvps: List[UserData]) -> None:
-        for entry in self.notifiedList:
-            if (event.isEventname(entry[0])):
-                if (entry[1] == "one day"):
-                    return
-        with smtplib.SMTP_SSL("smtp.gmail.com", self.emailPort, context=self.context) as server:
-            server.login(self.senderEmail, self.password)
-            for user in rsvps:
-                receiverEmail = user.getEmail()
-                message = self._oneDayNotificationMsg(event, user)
-                server.sendmail(self.senderEmail, receiverEmail, message.as_string())
-            self.notifiedList.append([event.getName(), "one day"])
-            self._saveNotifiedList()
+        if (self.notified.has(event.getName(), "one_day")):
+            return
+        messages = self.buildEventMessages("oneDayNotification", event, rsvps)
+        for user, message in zip(rsvps, messages):
+            self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), event.getName())
+        self.notified.add(event.getName(), ["one_day"])
 
     # Send email notification to one user for an event that happens the next day
     # Will only send if a notification has already been sent for the event
     def oneUserOneDayNotification(self, event: EventData, user: UserData) -> None:
-        alreadyNotified = False
-        for entry in self.notifiedList:
-            if (event.isEventname(entry[0])):
-                if (entry[1] == "one day"):
-                    alreadyNotified = True
-        if (not alreadyNotified):
+        if (not self.notified.has(event.getName(), "one_day")):
             return
         else:
-            with smtplib.SMTP_SSL("smtp.gmail.com", self.emailPort, context=self.context) as server:
-                server.login(self.senderEmail, self.password)
-                receiverEmail = user.getEmail()
-                message = self._oneDayNotificationMsg(event, user)
-                server.sendmail(self.senderEmail, receiverEmail, message.as_string())
-
-    # Returns MIMEMultipart for email notification for an event that happens the next day
-    def _oneDayNotificationMsg(self, event: EventData, user: UserData) -> MIMEMultipart:
-        message = MIMEMultipart("alternative")
-        message["Subject"] = f"Reminder: {event.getName()} Soon!"
-        message["From"] = self.senderEmail
-        message["To"] = user.getEmail()
-
-        app = Flask("tempForSendingEmails")
-        with app.app_context():
-            textMsg = render_template("emails/oneDayNotification.txt", eventName=event.getName(), username=user.getUsername(), date=event.getDateStr(), host=self.hostName)
-            htmlMsg = render_template("emails/oneDayNotification.html", eventName=event.getName(), username=user.getUsername(), date=event.getDateStr(), host=self.hostName)
-
-        textPart = MIMEText(textMsg, "plain")
-        htmlPart = MIMEText(htmlMsg, "html")
+            message = self.buildEventMessages("oneDayNotification", event, [user])[0]
+            self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), event.getName())
 
-        message.attach(textPart)
-        message.attach(htmlPart)
-        return message
-    
     # Send email notifications for an event that happens the next week
     def oneWeekNotification(self, event: EventData, rsvps: List[UserData]) -> None:
-        for entry in self.notifiedList:
-            if (event.isEventname(entry[0])):
-                if (entry[1] == "one week"):
-                    return
-        with smtplib.SMTP_SSL("smtp.gmail.com", self.emailPort, context=self.context) as server:
-            server.login(self.senderEmail, self.password)
-            for user in rsvps:
-                receiverEmail = user.getEmail()
-                message = self._oneWeekNotificationMsg(event, user)
-                server.sendmail(self.senderEmail, receiverEmail, message.as_string())
-            self.notifiedList.append([event.getName(), "one week"])
-            self._saveNotifiedList()
+        if (self.notified.has(event.getName(), "one_week")):
+            return
+        messages = self.buildEventMessages("oneWeekNotification", event, rsvps)
+        for user, message in zip(rsvps, messages):
+            self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), event.getName())
+        self.notified.add(event.getName(), ["one_week"])
 
-    # Returns MIMEMultipart for email notification for an event that happens the next day
-    def _oneWeekNotificationMsg(self, event: EventData, user: UserData) -> MIMEMultipart:
-        message = MIMEMultipart("alternative")
-        message["Subject"] = f"Reminder: {event.getName()} Tomorrow!"
-        message["From"] = self.senderEmail
-        message["To"] = user.getEmail()
+    # Send reminders for a list of (emailName, event, rsvps), emailName being "oneDayNotification"
+    # or "oneWeekNotification", as one digest email per user listing all of their events
+    # Users with one reminder get the usual email, reminders already sent are skipped
+    # Each event is recorded in the notified list, the same as oneDayNotification and oneWeekNotification
+    def sendReminderDigests(self, reminders: List[Tuple[str, EventData, List[UserData]]]) -> None:
+        sending = []
+        # {username: (user, {lowercase event name: (emailName, event), ...}), ...}
+        userReminders: Dict[str, Tuple[UserData, Dict[str, Tuple[str, EventData]]]] = {}
+        for emailName, event, rsvps in reminders:
+            if (self.notified.has(event.getName(), self.notificationTypes[emailName])):
+                continue
+            sending.append((emailName, event))
+            key = event.getName().lower()
+            for user in rsvps:
+                events = userReminders.setdefault(user.getUsername(), (user, {}))[1]
+                # An event due for both reminders is listed once, as starting tomorrow
+                if (key not in events or emailName == "oneDayNotification"):
+                    events[key] = (emailName, event)
 
-        app = Flask("tempForSendingEmails")
-        with app.app_context():
-            textMsg = render_template("emails/oneWeekNotification.txt", eventName=event.getName(), username=user.getUsername(), date=event.getDateStr(), host=self.hostName)
-            htmlMsg = render_template("emails/oneWeekNotification.html", eventName=event.getName(), username=user.getUsername(), date=event.getDateStr(), host=self.hostName)
+        # {(emailName, lowercase event name): (emailName, event, [user, ...]), ...}
+        singles: Dict[Tuple[str, str], Tuple[str, EventData, List[UserData]]] = {}
+        for user, events in userReminders.values():
+            if (len(events) == 1):
+                emailName, event = next(iter(events.values()))
+                singles.setdefault((emailName, event.getName().lower()), (emailName, event, []))[2].append(user)
+            else:
+                message = self._reminderDigestMessage(user, list(events.values()))
+                self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), "reminderDigest")
+        for emailName, event, users in singles.values():
+            messages = self.buildEventMessages(emailName, event, users)
+            for user, message in zip(users, messages):
+                self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), event.getName())
 
-        textPart = MIMEText(textMsg, "plain")
-        htmlPart = MIMEText(htmlMsg, "html")
+        for emailName, event in sending:
+            self.notified.add(event.getName(), [self.notificationTypes[emailName]])
 
-        message.attach(textPart)
-        message.attach(htmlPart)
-        return message
-    
     # Send email invite with link to event page to a list of users
     # Ignores users that have received an invite for that event
     def sendInvitation(self, event: EventData, users: List[UserData]) -> None:
-        tempEventInvites = [event.getName()]
-        for entry in self.invitedList:
-            if (event.isEventname(entry[0])):
-                remList = []
-                for user in users:
-                    if user.getUsername() in entry[1:]:
-                        remList.append(user)
-                for user in remList:
-                    users.remove(user)
-                
-                if len(users) == 0:
-                    return
-                else:
-                    tempEventInvites = entry
-                    self.invitedList.remove(entry)
+        users = [user for user in users if not self.invited.has(event.getName(), user.getUsername())]
+        if (users == []):
+            return
+        messages = self.buildEventMessages("sendInvitation", event, users)
+        for user, message in zip(users, messages):
+            self.outbox.enqueue(self.senderEmail, user.getEmail(), message.as_string(), event.getName())
+        self.invited.add(event.getName(), [user.getUsername() for user in users])
+
+    # Returns a MIMEMultipart for each user, for the email (emailSubjects key) about given event
+    # The event's part of the email is rendered once, only the username changes for each user
+    def buildEventMessages(self, emailName: str, event: EventData, users: List[UserData]) -> List[MIMEMultipart]:
+        subject = self.emailSubjects[emailName].format(eventName=event.getName())
+        textParts, htmlParts = self._renderEventParts(emailName, event)
+        messages = []
+        for user in users:
+            username = user.getUsername()
+            messages.append(self._newMessage(subject, user, username.join(textParts), str(escape(username)).join(htmlParts)))
+        return messages
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", self.emailPort, context=self.context) as server:
-            server.login(self.senderEmail, self.password)
-            for user in users:
-                receiverEmail = user.getEmail()
-                message = self._sendInvitationMsg(event, user)
-                tempEventInvites.append(user.getUsername())
-                server.sendmail(self.senderEmail, receiverEmail, message.as_string())
-            self.invitedList.append(tempEventInvites)
-            self._saveInvitedList()
+    # Returns MIMEMultipart for a digest of reminders [(emailName, event), ...] for one user, events listed by date
+    def _reminderDigestMessage(self, user: UserData, reminders: List[Tuple[str, EventData]]) -> MIMEMultipart:
+        reminders = sorted(reminders, key=lambda reminder: reminder[1].getSortKey())
+        items = [{"eventName": event.getName(), "date": event.getDateStr(), "when": self.reminderWhen[emailName]}
+                 for emailName, event in reminders]
+        context = {"username": user.getUsername(), "items": items, "host": self.hostName}
+        textTemplate, htmlTemplate = self.templates["reminderDigest"]
+        subject = self.emailSubjects["reminderDigest"].format(count=len(items))
+        return self._newMessage(subject, user, textTemplate.render(context), htmlTemplate.render(context))
 
-    # Returns MIMEMultipart for email invitation to an event
-    def _sendInvitationMsg(self, event: EventData, user: UserData) -> MIMEMultipart:
+    # Returns MIMEMultipart with text and html versions of an email to user
+    def _newMessage(self, subject: str, user: UserData, textMsg: str, htmlMsg: str) -> MIMEMultipart:
         message = MIMEMultipart("alternative")
-        message["Subject"] = f"Notification: You're Invited!"
+        message["Subject"] = subject
         message["From"] = self.senderEmail
         message["To"] = user.getEmail()
-
-        app = Flask("tempForSendingEmails")
-        with app.app_context():
-            textMsg = render_template("emails/sendInvitation.txt", eventName=event.getName(), username=user.getUsername(), organizer=event.getOrganizer(), host=self.hostName)
-            htmlMsg = render_template("emails/sendInvitation.html", eventName=event.getName(), username=user.getUsername(), organizer=event.getOrganizer(), host=self.hostName)
-
-        textPart = MIMEText(textMsg, "plain")
-        htmlPart = MIMEText(htmlMsg, "html")
-
-        message.attach(textPart)
-        message.attach(htmlPart)
+        message.attach(MIMEText(textMsg, "plain"))
+        message.attach(MIMEText(htmlMsg, "html"))
         return message
 
+    # Returns the text and html email rendered for an event, split where the username goes
+    def _renderEventParts(self, emailName: str, event: EventData) -> Tuple[List[str], List[str]]:
+        context = {"eventName": event.getName(), "date": event.getDateStr(), "organizer": event.getOrganizer(),
+                   "host": self.hostName, "username": self.usernameMark}
+        textTemplate, htmlTemplate = self.templates[emailName]
+        textParts = textTemplate.render(context).split(self.usernameMark)
+        htmlParts = htmlTemplate.render(context).split(self.usernameMark)
+        return (textParts, htmlParts)
+
 if __name__=="__main__":
     testEvent = EventData.EventBuilder("Event0", "2021-03-30", "user0", "none").RSVP(["user1", "user2"]).build()
     testUsers = [UserData("user1", "pw1", "111-111-1111", "csc3380.receive+user1@gmail.com", "12345"),
                  UserData("user2", "pw2", "222-222-2222", "csc3380.receive+user2@gmail.com", "12345")]
 
-    app = Flask(__name__)    
     EmHandler = EmailHandler("localhost")
     EmHandler.load([testEvent])
     
@@ -0,0 +1,132 @@
+#                                     Summary:
+#
+# This class keeps a record of the emails already sent for each event (the notification types
+# sent, or the users invited) so EmailHandler does not send the same email twice. Lookups are
+# hashed, and changes are appended to the ledger file instead of rewriting it. The file is
+# compacted (rewritten with only the current entries) when it is loaded and after a set
+# number of appended lines.
+#
+#
+#
+#                                     Data Members:
+#
+# filePath, entries, names, appendCount, lock
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", creates the ledger file if it does not exist.
+#
+# "load": Reads the ledger file, keeping only entries of active events, and compacts it.
+#
+# "has": Returns True if a value is recorded for an event.
+#
+# "get": Returns the values recorded for an event.
+#
+# "add": Records values for an event.
+#
+# "remove": Removes every value recorded for a list of events.
+#
+# "compact": Rewrites the ledger file with the current entries.
+
+import os
+import threading
+from typing import Dict, List
+
+# Each line of the file is "<event name> <value> <value>...", adding the values to the event,
+# or "- <event name>", removing the event. Spaces in event names are stored as '_'
+# Values are stored as they are and must not contain spaces, and are kept in the order they were added
+# Event names are matched ignoring case, like EventData.isEventname
+class EmailLedger:
+    compactLimit = 100
+
+    def __init__(self, filePath: str):
+        self.filePath = filePath
+        # {lowercase event name: {value: None, ...}, ...} (dict used as an ordered set)
+        self.entries: Dict[str, Dict[str, None]] = {}
+        # {lowercase event name: event name}, used when writing the file
+        self.names: Dict[str, str] = {}
+        # Lines appended since the file was last compacted
+        self.appendCount = 0
+        # Emails are sent from Flask threads and the task planner, every read and change holds the lock
+        self.lock = threading.Lock()
+        if (not os.path.exists(self.filePath)):
+            newFile = open(self.filePath, 'w')
+            newFile.close()
+
+    # Read the ledger file, ignoring events that are not active anymore, then compact it
+    def load(self, activeEventNames: List[str]) -> None:
+        activeKeys = set(name.lower() for name in activeEventNames)
+        entries = {}
+        names = {}
+        with open(self.filePath, 'r') as inFile:
+            for line in inFile:
+                line = line.strip().split()
+                if (len(line) < 2):
+                    continue
+                if (line[0] == '-'):
+                    entries.pop(line[1].replace('_', ' ').lower(), None)
+                    continue
+                eventName = line[0].replace('_', ' ')
+                key = eventName.lower()
+                if (key in activeKeys):
+                    entries.setdefault(key, {}).update(dict.fromkeys(line[1:]))
+                    names[key] = eventName
+        with self.lock:
+            self.entries = entries
+            self.names = {key: names[key] for key in entries}
+            self._compact()
+
+    # Returns True if value has been recorded for given event
+    def has(self, eventName: str, value: str) -> bool:
+        with self.lock:
+            return value in self.entries.get(eventName.lower(), ())
+
+    # Returns the values recorded for given event in the order they were added (empty list if none)
+    def get(self, eventName: str) -> List[str]:
+        with self.lock:
+            return list(self.entries.get(eventName.lower(), ()))
+
+    # Record values for given event (values already recorded are ignored)
+    def add(self, eventName: str, values: List[str]) -> None:
+        with self.lock:
+            key = eventName.lower()
+            values = [value for value in dict.fromkeys(values) if value not in self.entries.get(key, ())]
+            if (values == []):
+                return
+            self.entries.setdefault(key, {}).update(dict.fromkeys(values))
+            self.names[key] = eventName
+            self._append(eventName.replace(' ', '_') + ' ' + ' '.join(values))
+
+    # Remove every value recorded for each event in list
+    def remove(self, eventNames: List[str]) -> None:
+        with self.lock:
+            for eventName in eventNames:
+                key = eventName.lower()
+                if (key in self.entries):
+                    del self.entries[key]
+                    del self.names[key]
+                    self._append("- " + eventName.replace(' ', '_'))
+
+    # Rewrite the ledger file with one line per event
+    def compact(self) -> None:
+        with self.lock:
+            self._compact()
+
+    # Must be called with the lock held
+    def _compact(self) -> None:
+        with open(self.filePath + ".tmp", 'w') as outFile:
+            for key, values in self.entries.items():
+                print(self.names[key].replace(' ', '_') + ' ' + ' '.join(values), file=outFile)
+        os.replace(self.filePath + ".tmp", self.filePath)
+        self.appendCount = 0
+
+    # Append a line to the ledger file, compacting once compactLimit lines have been appended
+    # Must be called with the lock held
+    def _append(self, line: str) -> None:
+        with open(self.filePath, 'a') as outFile:
+            print(line, file=outFile)
+        self.appendCount = self.appendCount + 1
+        if (self.appendCount >= self.compactLimit):
+            self._compact()
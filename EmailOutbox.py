@@ -0,0 +1,296 @@
+#                                     Summary:
+#
+# This class is a durable outbox for emails. Messages are written to a spool folder and
+# delivered by background worker threads, so pages that send emails do not wait on the mail
+# server. Failed deliveries are retried with exponential backoff, messages that keep failing
+# (or are refused by the server) are moved to a dead letter folder, and messages still in the
+# spool when the program stops are delivered after it restarts. The order and rate emails are
+# sent at is set by a SendScheduler (emails of different events take turns, within the limits).
+# Several processes can share the spool folder (e.g. Flask's reloader runs the program twice):
+# a message is claimed by renaming its file before it is sent, so only one process sends it.
+#
+#
+#
+#                                     Data Members:
+#
+# spoolPath, deadPath, send, scheduler, maxAttempts, retryDelay, maxRetryDelay, pending, order, inFlight,
+# latencies, sentCount, failedCount, deadCount, stopping, condition, workers
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", creates the spool folders, loads messages left from the
+# last run and starts the workers.
+#
+# "enqueue": Writes a message to the spool and returns immediately.
+#
+# "getStats": Returns the queue depth, delivery counts, delivery latency and projected time
+# to send the queue.
+#
+# "projectCompletion": Returns the seconds needed to send the queue and any more emails.
+#
+# "close": Stops the workers (messages not sent stay in the spool).
+#
+# "deliver": Claims and sends one message, then removes it, schedules a retry or dead letters it.
+#
+# "claim": Renames a message's spool file so no other process sends it.
+
+import heapq
+import itertools
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+from SendScheduler import SendScheduler
+
+class EmailOutbox:
+    # Seconds after which a claimed message is taken back (the process sending it stopped)
+    claimTimeout = 600
+
+    # send(sender, receiver, message) delivers one message and raises an exception if it fails
+    # Failed messages are retried after retryDelay, 2 * retryDelay, 4 * retryDelay... seconds (at most maxRetryDelay)
+    # scheduler limits the send rate (no limit if None)
+    def __init__(self, spoolPath: str, send: Callable[[str, str, str], None], workerCount: int=2,
+                 maxAttempts: int=8, retryDelay: float=30, maxRetryDelay: float=3600, scheduler: SendScheduler=None):
+        self.spoolPath = spoolPath
+        self.deadPath = os.path.join(spoolPath, "dead")
+        self.send = send
+        # Messages that are due, waiting for their turn and the send rate
+        if (scheduler == None):
+            scheduler = SendScheduler()
+        self.scheduler = scheduler
+        self.maxAttempts = maxAttempts
+        self.retryDelay = retryDelay
+        self.maxRetryDelay = maxRetryDelay
+        os.makedirs(self.deadPath, exist_ok=True)
+
+        # Messages not due yet (new messages are due at once): [(time of next attempt, order, message id, group), ...] as a min-heap
+        self.pending: List[Tuple[float, int, str, str]] = []
+        self.order = itertools.count()
+        self.inFlight = 0
+        # Seconds from enqueue to delivery of the most recent messages
+        self.latencies = deque(maxlen=1000)
+        self.sentCount = 0
+        self.failedCount = 0
+        self.deadCount = len(os.listdir(self.deadPath))
+        self.stopping = False
+        self.condition = threading.Condition()
+        self._recover()
+
+        self.workers = [threading.Thread(target=self._work, name=f"EmailOutbox-{i}", daemon=True) for i in range(workerCount)]
+        for worker in self.workers:
+            worker.start()
+
+    # Write message to the spool and wake a worker, returns the message id
+    # Messages in different groups (events) take turns being sent
+    def enqueue(self, sender: str, receiver: str, message: str, group: str="") -> str:
+        now = time.time()
+        entry = {"id": uuid.uuid4().hex, "sender": sender, "receiver": receiver, "message": message, "group": group,
+                 "created": now, "attempts": 0, "nextAttempt": now, "lastError": None}
+        self._writeEntry(entry)
+        with self.condition:
+            heapq.heappush(self.pending, (now, next(self.order), entry["id"], group))
+            self.condition.notify()
+        return entry["id"]
+
+    # Returns seconds needed to send the queued messages plus extraCount more (not counting failures)
+    # Messages waiting to be retried are counted as if they were due now
+    def projectCompletion(self, extraCount: int=0) -> float:
+        with self.condition:
+            return self.scheduler.projectCompletion(len(self.pending) + extraCount)
+
+    # Returns queue depth (waiting and being sent), delivery counts and latency (seconds) of recent deliveries
+    def getStats(self) -> Dict[str, float]:
+        with self.condition:
+            latencies = sorted(self.latencies)
+            stats = {"queued": len(self.pending) + len(self.scheduler), "inFlight": self.inFlight, "sent": self.sentCount,
+                     "failedAttempts": self.failedCount, "dead": self.deadCount,
+                     "projectedSeconds": self.scheduler.projectCompletion(len(self.pending))}
+        if (latencies):
+            stats["averageLatency"] = sum(latencies) / len(latencies)
+            stats["p95Latency"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats["maxLatency"] = latencies[-1]
+        else:
+            stats["averageLatency"] = stats["p95Latency"] = stats["maxLatency"] = 0.0
+        return stats
+
+    # Stop the workers after the messages being sent are finished
+    # Waiting messages stay in the spool and are sent after the next start
+    def close(self, timeout: float=None) -> None:
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for worker in self.workers:
+            worker.join(timeout)
+
+    # Send message with given id, then remove it from the spool, schedule a retry or dead letter it
+    # Nothing is done if another process has claimed (or sent) the message
+    def _deliver(self, messageId: str) -> None:
+        if (not self._claim(messageId)):
+            return
+        claimPath = self._claimPath(messageId)
+        entry = self._readEntry(claimPath)
+        if (entry == None):
+            os.replace(claimPath, os.path.join(self.deadPath, messageId + ".json"))
+            with self.condition:
+                self.deadCount = self.deadCount + 1
+            return
+        try:
+            self.send(entry["sender"], entry["receiver"], entry["message"])
+        except Exception as error:
+            entry["attempts"] = entry["attempts"] + 1
+            entry["lastError"] = repr(error)
+            with self.condition:
+                self.failedCount = self.failedCount + 1
+            if (self._isPermanent(error) or entry["attempts"] >= self.maxAttempts):
+                self._deadLetter(entry)
+                return
+            # Exponential backoff with jitter so retries after an outage do not arrive together
+            delay = min(self.maxRetryDelay, self.retryDelay * 2 ** (entry["attempts"] - 1))
+            entry["nextAttempt"] = time.time() + delay * random.uniform(0.8, 1.2)
+            # Release the claim with the updated message
+            self._writeEntry(entry, claimPath)
+            os.replace(claimPath, self._entryPath(messageId))
+            with self.condition:
+                heapq.heappush(self.pending, (entry["nextAttempt"], next(self.order), messageId, entry.get("group", "")))
+                self.condition.notify()
+            return
+        os.remove(claimPath)
+        with self.condition:
+            self.sentCount = self.sentCount + 1
+            self.latencies.append(time.time() - entry["created"])
+
+    # Worker thread: wait until a message is due and the scheduler allows sending, then deliver it
+    def _work(self) -> None:
+        while (True):
+            with self.condition:
+                messageId = None
+                while (messageId == None):
+                    if (self.stopping):
+                        return
+                    # Hand messages that are due to the scheduler
+                    now = time.time()
+                    while (self.pending and self.pending[0][0] <= now):
+                        nextAttempt, order, dueId, group = heapq.heappop(self.pending)
+                        self.scheduler.push(group, dueId)
+                    timeout = None
+                    if (len(self.scheduler) > 0):
+                        timeout = self.scheduler.waitTime()
+                        if (timeout <= 0):
+                            messageId = self.scheduler.pop()
+                            break
+                    if (self.pending):
+                        dueIn = self.pending[0][0] - now
+                        if (timeout == None or dueIn < timeout):
+                            timeout = dueIn
+                    self.condition.wait(timeout)
+                self.inFlight = self.inFlight + 1
+            try:
+                self._deliver(messageId)
+            finally:
+                with self.condition:
+                    self.inFlight = self.inFlight - 1
+
+    # Load messages left in the spool by the last run (unreadable files are dead lettered)
+    # Messages claimed by another process are loaded too, and sent if the claim is not released in claimTimeout
+    def _recover(self) -> None:
+        now = time.time()
+        for fileName in os.listdir(self.spoolPath):
+            filePath = os.path.join(self.spoolPath, fileName)
+            try:
+                age = now - os.path.getmtime(filePath)
+            except OSError:
+                # Sent or claimed by another process while listing
+                continue
+            if (fileName.endswith(".tmp")):
+                # Write was interrupted, the message was never enqueued (newer files can be another process' writes)
+                if (age > self.claimTimeout):
+                    try:
+                        os.remove(filePath)
+                    except OSError:
+                        pass
+            elif (fileName.endswith(".sending")):
+                # Tried again once the claim is stale, in case the process sending it stopped
+                entry = self._readEntry(filePath) or {}
+                messageId = fileName[:-len(".json.sending")]
+                heapq.heappush(self.pending, (now + max(0.0, self.claimTimeout - age), next(self.order), messageId, entry.get("group", "")))
+            elif (fileName.endswith(".json")):
+                entry = self._readEntry(filePath)
+                if (entry == None):
+                    try:
+                        os.replace(filePath, os.path.join(self.deadPath, fileName))
+                        self.deadCount = self.deadCount + 1
+                    except OSError:
+                        pass
+                else:
+                    heapq.heappush(self.pending, (entry["nextAttempt"], next(self.order), entry["id"], entry.get("group", "")))
+
+    # Claim message with given id by renaming its spool file, returns False if another process has it (or it was sent)
+    # A claim older than claimTimeout was left by a process that stopped while sending, and is taken over
+    def _claim(self, messageId: str) -> bool:
+        filePath = self._entryPath(messageId)
+        claimPath = self._claimPath(messageId)
+        try:
+            # Claim time is the file's modification time, set before renaming so the claim is never seen stale
+            os.utime(filePath)
+            os.rename(filePath, claimPath)
+            return True
+        except OSError:
+            pass
+        try:
+            if (time.time() - os.path.getmtime(claimPath) <= self.claimTimeout):
+                return False
+            # Release the stale claim and claim the message again (only one process succeeds in each rename)
+            os.rename(claimPath, filePath)
+            os.utime(filePath)
+            os.rename(filePath, claimPath)
+            return True
+        except OSError:
+            return False
+
+    # Returns True if retrying will not help (the server refused the message with a 5xx reply)
+    def _isPermanent(self, error: Exception) -> bool:
+        if (isinstance(error, smtplib.SMTPRecipientsRefused)):
+            return all(code >= 500 for code, reply in error.recipients.values())
+        if (isinstance(error, smtplib.SMTPResponseException)):
+            return error.smtp_code >= 500
+        return False
+
+    # Move claimed message to the dead letter folder
+    def _deadLetter(self, entry: dict) -> None:
+        claimPath = self._claimPath(entry["id"])
+        self._writeEntry(entry, claimPath)
+        os.replace(claimPath, os.path.join(self.deadPath, entry["id"] + ".json"))
+        with self.condition:
+            self.deadCount = self.deadCount + 1
+
+    def _entryPath(self, messageId: str) -> str:
+        return os.path.join(self.spoolPath, messageId + ".json")
+
+    # Spool file of a message while a worker is sending it
+    def _claimPath(self, messageId: str) -> str:
+        return self._entryPath(messageId) + ".sending"
+
+    # Write message to its spool file, or filePath (written to a temporary file first so a crash never leaves half a message)
+    def _writeEntry(self, entry: dict, filePath: str=None) -> None:
+        if (filePath == None):
+            filePath = self._entryPath(entry["id"])
+        with open(filePath + ".tmp", 'w') as outFile:
+            json.dump(entry, outFile)
+            outFile.flush()
+            os.fsync(outFile.fileno())
+        os.replace(filePath + ".tmp", filePath)
+
+    # Returns message read from a spool file (None if missing or unreadable)
+    def _readEntry(self, filePath: str) -> dict:
+        try:
+            with open(filePath, 'r') as inFile:
+                return json.load(inFile)
+        except (OSError, ValueError):
+            return None
@@ -7,7 +7,8 @@
 #
 #                                           Data members:
 #
-# events, oldEvents, setData, saveData
+# events, eventIndex, organizerIndex, rsvpIndex, zipIndex, dateIndex, tagIndex, trigramIndex,
+# popularHeap, expiryHeap, generation, changeListeners, setData, saveData
 #
 #
 #                                            Methods:
@@ -16,18 +17,37 @@
 # to other classes.
 #
 # "saveChanges": This method passes data to the "EventIO" class and saves it.
+# Single changes are instead recorded to the "EventIO" journal by each method below.
+#
+# "getGeneration": Returns a number that increases every time an event is changed.
+#
+# "addChangeListener": Registers a function called whenever an event is created, removed,
+# edited or retired by a user (used to plan the timed tasks again, see TaskPlanner).
 #
 # "getEvent": This method returns the name of each event.
 #
 # "getAllEvents": This short method returns all events to the "EventData" list.
 #
+# "getSortedEvents": Returns all events in chronological order, without sorting.
+#
+# "getEventsBetween": Returns the events between two dates, in chronological order.
+#
 # "getOldEvent": Returns an event that has already passed.
 #
-# "getOldEvents": Returns every out of date event.
+# "getOldEvents": Returns a page of out of date events, read from the archive when requested.
+#
+# "getOldEventCount": Returns the number of out of date events.
 #
 # "getOneDayEvents": Appends the list by returning all events that start within
 # 24 hours.
 #
+# "getOneWeekEvents": Returns all events that start within the next week.
+#
+# "getNextExpiry": Returns when the next event stops being active, read from the top of the
+# expiry heap.
+#
+# "getFirstDateAfter": Returns the date of the first event after a given day, read from the date index.
+#
 # "addRSVP": Allows users to RSVP by adding them to the event. Has a self check
 # which returns "true" if the addition was sucessful.
 #
@@ -45,7 +65,7 @@
 # "retireEvent": Locates passed event as a retired event, and updates the "database".
 #
 # "searchName": Searches the databse for events by name, and returns events with
-# matching names.
+# matching names (ignoring case). Uses the trigram index to skip events that cannot match.
 #
 # "searchOrganizer": Searches for events by the specified organizer, and returns
 # matching searches.
@@ -56,208 +76,431 @@
 #
 # "refineSearchDate": Narrows the search by applying a date parameter.
 #
-# "searchPopular": Returns the three events with the most RSVPs. 
+# "searchPopular": Returns the POPULAR_EVENT_COUNT events with the most RSVPs, read from
+# the top of the popularity heap.
 #
 # "refineSearchTags": Narrow the search by applying tags to searched events.
 #
-# "checkActive": Scans every event and removed passed events.
+# "searchTags": Returns the events that have every given tag.
+#
+# "countTags": Returns how many events have each tag.
+#
+# "checkActive": Removes passed events, popping only the expired events from the expiry heap.
+# Every event retired by one check is saved with a single write.
+#
+# "indexEvent": Adds an event to the lookup indexes (eventIndex: lowercase name -> event,
+# organizerIndex/rsvpIndex/zipIndex: organizer/username/zip -> {lowercase name -> event},
+# dateIndex: sorted list of (date, time, name, event),
+# tagIndex: tag -> {lowercase name -> event},
+# trigramIndex: 3 letter piece of a lowercase name -> {lowercase names},
+# popularHeap: min-heap of (-number of RSVPs, index order, lowercase name),
+# expiryHeap: min-heap of (expiry, index order, lowercase name)).
+#
+# "unindexEvent": Removes an event from the lookup indexes.
 
-from typing import List
+import bisect
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Set, Tuple
 from EventIO import EventIO
-from dataClasses.EventData import EventData
+from EventSQLiteIO import EventSQLiteIO
+from dataClasses.EventData import EventData, tagsToMask
+from dataClasses.extras import STORAGE_BACKEND, VALID_TAGS, TAG_BITS, POPULAR_EVENT_COUNT
 
 class EventHandler:
     def __init__(self):
-        self.objIO: EventIO = EventIO()
+        if (STORAGE_BACKEND == "sqlite"):
+            self.objIO: EventIO = EventSQLiteIO()
+        else:
+            self.objIO: EventIO = EventIO()
         self.objIO.loadData()
         self.events: List[EventData] = self.objIO.getData()
-        self.oldEvents: List[EventData] = self.objIO.getOldData()
+        # Active events by lowercase name (old events are indexed by objIO)
+        self.eventIndex: Dict[str, EventData] = {}
+        # Events by lowercase organizer, RSVP username and zip code
+        self.organizerIndex: Dict[str, Dict[str, EventData]] = {}
+        self.rsvpIndex: Dict[str, Dict[str, EventData]] = {}
+        self.zipIndex: Dict[str, Dict[str, EventData]] = {}
+        # Events by valid tag
+        self.tagIndex: Dict[str, Dict[str, EventData]] = {}
+        # Lowercase event names by each 3 letter piece of the name
+        self.trigramIndex: Dict[str, Set[str]] = {}
+        # Min-heap of events by most RSVPs, ties broken by the order events were indexed in
+        # [(-number of RSVPs, index order, lowercase name), ...]
+        # Entries that do not match indexedPopularKey are left by RSVP changes and removed events, and skipped
+        self.popularHeap: List[Tuple[int, int, str]] = []
+        self.indexedPopularKey: Dict[str, Tuple[int, int, str]] = {}
+        self.indexOrder = 0
+        # Events sorted by date, time, then name: [(date, time, name, event), ...]
+        self.dateIndex: List[Tuple[str, str, str, EventData]] = []
+        # Zip code, sort key and tag mask each event was indexed with
+        # (zip, time and tags can be edited before replaceEvent is called)
+        self.indexedZip: Dict[str, str] = {}
+        self.indexedSortKey: Dict[str, Tuple[str, str, str]] = {}
+        self.indexedTagMask: Dict[str, int] = {}
+        # Min-heap of the times events stop being active: [(expiry, index order, lowercase name), ...]
+        # Entries of removed or replaced events are skipped when popped (checked against indexedExpiry)
+        self.expiryHeap: List[Tuple[datetime, int, str]] = []
+        self.indexedExpiry: Dict[str, Tuple[datetime, int]] = {}
+        for event in self.events:
+            self._indexEvent(event)
+        # Increased by every change to the events (used to tell when cached pages are out of date)
+        self.generation = 0
+        # Called when events are created, removed, edited or retired (not on RSVP changes or by checkActive)
+        self.changeListeners: List[Callable[[EventData], None]] = []
     
     # Sends events to EventIO and saves data
     def saveChanges(self) -> None:
         self.objIO.setData(self.events)
         self.objIO.saveData()
     
+    # Returns the number of changes made to the events since loading
+    def getGeneration(self) -> int:
+        return self.generation
+
+    # Call listener after every event is created, removed, edited or retired, with the new or edited
+    # event (None if the event was removed, or retired without a next occurrence)
+    # checkActive does not call the listeners, it is run by the timed tasks, which plan again afterwards
+    def addChangeListener(self, listener: Callable[[EventData], None]) -> None:
+        self.changeListeners.append(listener)
+
     # Returns named event
     def getEvent(self, name: str) -> EventData:
-        for event in self.events:
-            if event.isEventname(name):
-                return event
-        return None
+        return self.eventIndex.get(name.lower())
 
     # Returns all events
     def getAllEvents(self) -> List[EventData]:
         return self.events
+
+    # Returns all events sorted by date, time, then name
+    def getSortedEvents(self) -> List[EventData]:
+        return [entry[3] for entry in self.dateIndex]
+
+    # Returns events from startDate to endDate (both included) sorted by date, time, then name
+    def getEventsBetween(self, startDate: date, endDate: date) -> List[EventData]:
+        start = bisect.bisect_left(self.dateIndex, (startDate.strftime("%Y-%m-%d"),))
+        end = bisect.bisect_left(self.dateIndex, ((endDate + timedelta(days=1)).strftime("%Y-%m-%d"),))
+        return [entry[3] for entry in self.dateIndex[start:end]]
     
     # Returns named out-of-date event
     def getOldEvent(self, name: str) -> EventData:
-        for event in self.oldEvents:
-            if event.isEventname(name):
-                return event
-        return None
-
-    # Returns all out-of-date events
-    def getOldEvents(self) -> List[EventData]:
-        return self.oldEvents
+        return self.objIO.getOldEvent(name)
+
+    # Returns count out-of-date events starting at start (sorted by date, time, then name)
+    def getOldEvents(self, start: int, count: int) -> List[EventData]:
+        return self.objIO.getOldEvents(start, count)
+
+    # Returns number of out-of-date events
+    def getOldEventCount(self) -> int:
+        return self.objIO.getOldEventCount()
     
-    # Returns events starting within 1 day
+    # Returns events starting within 1 day (today or tomorrow, same as EventData.isNextDay)
     def getOneDayEvents(self) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if event.isNextDay():
-                retEvents.append(event)
-        return retEvents
+        today = datetime.today().date()
+        return self.getEventsBetween(today, today + timedelta(days=1))
     
-    # Returns events starting within 1 week
+    # Returns events starting within 1 week (after today and before a week from today, same as EventData.isNextWeek)
     def getOneWeekEvents(self) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if event.isNextWeek():
-                retEvents.append(event)
-        return retEvents
+        today = datetime.today().date()
+        return self.getEventsBetween(today + timedelta(days=1), today + timedelta(days=6))
+
+    # Returns the local time the next event stops being active, the time checkActive retires it (None if no event expires)
+    def getNextExpiry(self) -> datetime:
+        # Drop entries of removed or replaced events from the top of the heap
+        while (self.expiryHeap and not self.indexedExpiry.get(self.expiryHeap[0][2]) == self.expiryHeap[0][:2]):
+            heapq.heappop(self.expiryHeap)
+        if (not self.expiryHeap):
+            return None
+        return self.expiryHeap[0][0] + EventData.CentralOffset
+
+    # Returns the date of the first event after given day (None if there are no later events)
+    def getFirstDateAfter(self, day: date) -> date:
+        start = bisect.bisect_left(self.dateIndex, ((day + timedelta(days=1)).strftime("%Y-%m-%d"),))
+        if (start == len(self.dateIndex)):
+            return None
+        return self.dateIndex[start][3].date
     
     # Add user to event (Returns True if successful)
     def addRSVP(self, username: str, eventName: str) -> bool:
-        for event in self.events:
-            if event.isEventname(eventName):
-                event.addRSVP(username)
-                self.saveChanges()
-                return True
-        return False
+        event = self.getEvent(eventName)
+        if (not event):
+            return False
+        event.addRSVP(username)
+        self._addToIndex(self.rsvpIndex, username, event)
+        self._updatePopularity(event)
+        self.objIO.recordAddRSVP(event.getName(), username)
+        self.generation = self.generation + 1
+        return True
     
     # Remove user from event (Returns True if successful)
     # Will not remove the organizer
     def removeRSVP(self, username: str, eventName: str) -> bool:
-        for event in self.events:
-            if event.isEventname(eventName):
-                if (event.isOrganizerName(username)):
-                    return False
-                event.removeRSVP(username)
-                self.saveChanges()
-                return True
-        return False
+        event = self.getEvent(eventName)
+        if (not event or event.isOrganizerName(username)):
+            return False
+        event.removeRSVP(username)
+        self._removeFromIndex(self.rsvpIndex, username, event)
+        self._updatePopularity(event)
+        self.objIO.recordRemoveRSVP(event.getName(), username)
+        self.generation = self.generation + 1
+        return True
 
     # Take as input a new EventData object, stores it in events list, then saves to file
     # Returns True if event is created
     def newEvent(self, newEvent: EventData) -> bool:
-        # Check if event already exists (same exact name)
-        for event in self.events:
-            if event.isEvent(newEvent):
-                return False
+        # Check if event already exists (same name, ignoring case)
+        if (self.getEvent(newEvent.getName())):
+            return False
         # Check if valid recurring (if monthly, only allows day <28)
         if (not newEvent.isValidRecurring()):
             return False
 
         self.events.append(newEvent)
-        self.saveChanges()
+        self._indexEvent(newEvent)
+        self.objIO.recordNewEvent(newEvent)
+        self.generation = self.generation + 1
+        self._notifyChange(newEvent)
         return True
 
     # Deletes event from memory, then saves to file
     def removeEvent(self, remEvent: EventData) -> bool:
-        for event in self.events:
-            if event.isEvent(remEvent):
-                self.events.remove(event)
-                self.saveChanges()
-                return True
-        return False
+        event = self.getEvent(remEvent.getName())
+        if (not event):
+            return False
+        self.events.remove(event)
+        self._unindexEvent(event)
+        self.objIO.recordRemoveEvent(event)
+        self.generation = self.generation + 1
+        self._notifyChange(None)
+        return True
     
     # Replaces event in memory, then saves to file
     def replaceEvent(self, newEvent: EventData) -> bool:
-        for event in self.events:
-            if event.isEvent(newEvent):
-                self.events.remove(event)
-                self.events.append(newEvent)
-                self.saveChanges()
-                return True
-        return False
+        event = self.getEvent(newEvent.getName())
+        if (not event):
+            return False
+        self.events.remove(event)
+        self._unindexEvent(event)
+        self.events.append(newEvent)
+        self._indexEvent(newEvent)
+        self.objIO.recordReplaceEvent(newEvent)
+        self.generation = self.generation + 1
+        self._notifyChange(newEvent)
+        return True
 
     # Moves event to old events, then saves to file
+    # A recurring event is replaced by its next occurrence (same name)
     def retireEvent(self, oldEvent: EventData) -> bool:
-        for event in self.events:
-            if event.isEvent(oldEvent):
-                if oldEvent.isRecurring():
-                    self.events.append(oldEvent.getNextRecurringEvent())
-                self.events.remove(event)
-                self.oldEvents.append(event)
-                self.saveChanges()
-                return True
-        return False
-
-    # Returns events matching given name (If the name is a substring of the event name)
+        event = self.getEvent(oldEvent.getName())
+        if (not event):
+            return False
+        nextEvent = self._retire(event)
+        self.objIO.recordRetireEvent(event, nextEvent)
+        self.generation = self.generation + 1
+        self._notifyChange(nextEvent)
+        return True
+
+    # Returns events matching given name (If the name is a substring of the event name, ignoring case)
+    # Only names containing every 3 letter piece of the search are checked
     def searchName(self, name: str) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if name in event.getName():
-                retEvents.append(event)
-        return retEvents
+        name = name.lower()
+        if (len(name) < 3):
+            candidates = self.eventIndex.keys()
+        else:
+            postings = sorted([self.trigramIndex.get(trigram, set()) for trigram in self._trigrams(name)], key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        return [self.eventIndex[key] for key in candidates if name in key]
 
     # Returns events with given organizer
     def searchOrganizer(self, organizer: str) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if event.isOrganizerName(organizer):
-                retEvents.append(event)
-        return retEvents
+        return list(self.organizerIndex.get(organizer.lower(), {}).values())
 
     # Returns events with given username in RSVP list
     def searchRSVP(self, username: str) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if event.hasUserRSVP(username):
-                retEvents.append(event)
-        return retEvents
+        return list(self.rsvpIndex.get(username, {}).values())
 
     # Returns events in given zip code
     def searchZip(self, zip: str) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if event.inZipCode(zip):
-                retEvents.append(event)
-        return retEvents
+        return list(self.zipIndex.get(zip, {}).values())
 
     # Returns events at given date that are in eventList
-    def refineSearchDate(self, eventList: List[EventData], date: str):
-        retEvents = []
-        for event in eventList:
-            if (event.isOnDate(date)):
-                retEvents.append(event)
-
-        return retEvents
+    def refineSearchDate(self, eventList: List[EventData], date: date):
+        inList = set([id(event) for event in eventList])
+        return [event for event in self.getEventsBetween(date, date) if id(event) in inList]
 
     # Returns events with given tags that are in eventList
     def refineSearchTags(self, eventList: List[EventData], tags: List[str]):
-        retEvents = []
+        mask = tagsToMask(tags)
+        if (mask == None):
+            return [event for event in eventList if event.hasTags(tags)]
+        return [event for event in eventList if event.getTagMask() & mask == mask]
+
+    # Returns events with all given tags (intersection of each tag's events)
+    def searchTags(self, tags: List[str]) -> List[EventData]:
+        if (tags == []):
+            return list(self.events)
+        postings = sorted([self.tagIndex.get(tag, {}) for tag in tags], key=len)
+        return [event for key, event in postings[0].items() if all(key in posting for posting in postings[1:])]
+
+    # Returns the number of events with each tag in VALID_TAGS (same order)
+    # Counts all active events if eventList is None
+    def countTags(self, eventList: List[EventData]=None) -> List[int]:
+        if (eventList == None):
+            return [len(self.tagIndex.get(tag, {})) for tag in VALID_TAGS]
+        # Count each distinct tag mask once, then add its count to each of its tags
+        maskCounts = {}
         for event in eventList:
-            if (event.hasTags(tags)):
-                retEvents.append(event)
-        
-        return retEvents
-
-    # Returns 3 events with the most RSVP's
-    def searchPopular(self):
-        retEvents = []
-        currentPopular = None
-        if (len(self.events) <= 3):
-            return self.events
-        for i in range(3):
-            numRSVP = 0
-            for event in self.events:
-                currentNameList = [entry.getName() for entry in retEvents]
-                if (event.getName() in currentNameList):
-                    continue
-                else:
-                    eventRSVPNum = event.getRSVPNum()
-                    if (eventRSVPNum > numRSVP):
-                        numRSVP = eventRSVPNum
-                        currentPopular = event
-            retEvents.append(currentPopular)
-        return retEvents
+            mask = event.getTagMask()
+            maskCounts[mask] = maskCounts.get(mask, 0) + 1
+        counts = []
+        for tag in VALID_TAGS:
+            counts.append(sum([count for mask, count in maskCounts.items() if mask & TAG_BITS[tag]]))
+        return counts
+
+    # Returns POPULAR_EVENT_COUNT events with the most RSVP's
+    # Walks the top of the popularity heap in order without changing it, skipping stale entries
+    def searchPopular(self) -> List[EventData]:
+        heap = self.popularHeap
+        popular = []
+        names = set()
+        # [(heap entry, position in heap), ...] as a min-heap, starting from the top
+        candidates = []
+        if (heap):
+            candidates.append((heap[0], 0))
+        while (candidates and len(popular) < POPULAR_EVENT_COUNT):
+            key, position = heapq.heappop(candidates)
+            if (self.indexedPopularKey.get(key[2]) == key and not key[2] in names):
+                names.add(key[2])
+                popular.append(self.eventIndex[key[2]])
+            for child in (2 * position + 1, 2 * position + 2):
+                if (child < len(heap)):
+                    heapq.heappush(candidates, (heap[child], child))
+        return popular
     
-    # Checks all events and removes out-of-date events
+    # Removes out-of-date events, returns the removed events
+    # Only events at the top of the expiry heap are checked, all of them are saved at once
+    # A recurring event's next occurrence is pushed to the heap, and retired too if it has also passed
     def checkActive(self) -> List[EventData]:
-        retEvents = []
-        for event in self.events:
-            if not event.isActive():
-                retEvents.append(event)
-                self.retireEvent(event)
-        return retEvents
+        now = datetime.now() - EventData.CentralOffset
+        retired = []
+        while (self.expiryHeap and self.expiryHeap[0][0] <= now):
+            expiry, order, key = heapq.heappop(self.expiryHeap)
+            if (not self.indexedExpiry.get(key) == (expiry, order)):
+                continue
+            event = self.eventIndex[key]
+            retired.append((event, self._retire(event)))
+        if (retired):
+            self.objIO.recordRetireEvents(retired)
+            self.generation = self.generation + 1
+        return [event for event, nextEvent in retired]
+
+    # Call every change listener with the new or edited event (None if there is none)
+    def _notifyChange(self, event: EventData) -> None:
+        for listener in self.changeListeners:
+            listener(event)
+
+    # Removes event from memory and the lookup indexes, adding its next occurrence if recurring
+    # Returns the next occurrence (None if not recurring)
+    def _retire(self, event: EventData) -> EventData:
+        self.events.remove(event)
+        self._unindexEvent(event)
+        nextEvent = None
+        if (event.isRecurring()):
+            nextEvent = event.getNextRecurringEvent()
+            self.events.append(nextEvent)
+            self._indexEvent(nextEvent)
+        return nextEvent
+
+    # Add event to the lookup indexes
+    def _indexEvent(self, event: EventData) -> None:
+        self.eventIndex[event.getName().lower()] = event
+        self._addToIndex(self.organizerIndex, event.getOrganizer().lower(), event)
+        for username in event.getRSVP():
+            self._addToIndex(self.rsvpIndex, username, event)
+        self._addToIndex(self.zipIndex, event.getZip(), event)
+        self.indexedZip[event.getName().lower()] = event.getZip()
+        sortKey = event.getSortKey()
+        bisect.insort(self.dateIndex, sortKey + (event,))
+        self.indexedSortKey[event.getName().lower()] = sortKey
+        tagMask = event.getTagMask()
+        for tag in VALID_TAGS:
+            if (tagMask & TAG_BITS[tag]):
+                self._addToIndex(self.tagIndex, tag, event)
+        self.indexedTagMask[event.getName().lower()] = tagMask
+        self.indexOrder = self.indexOrder + 1
+        self._pushPopular((-event.getRSVPNum(), self.indexOrder, event.getName().lower()))
+        expiry = event.getExpiry()
+        if (not expiry == None):
+            heapq.heappush(self.expiryHeap, (expiry, self.indexOrder, event.getName().lower()))
+            self.indexedExpiry[event.getName().lower()] = (expiry, self.indexOrder)
+            # Rebuild the heap once most of its entries belong to removed or replaced events
+            if (len(self.expiryHeap) > 2 * len(self.indexedExpiry) + 16):
+                self.expiryHeap = [(expiry, order, key) for key, (expiry, order) in self.indexedExpiry.items()]
+                heapq.heapify(self.expiryHeap)
+        for trigram in self._trigrams(event.getName().lower()):
+            if (not trigram in self.trigramIndex):
+                self.trigramIndex[trigram] = set()
+            self.trigramIndex[trigram].add(event.getName().lower())
+
+    # Remove event from the lookup indexes
+    def _unindexEvent(self, event: EventData) -> None:
+        self.eventIndex.pop(event.getName().lower(), None)
+        self._removeFromIndex(self.organizerIndex, event.getOrganizer().lower(), event)
+        for username in event.getRSVP():
+            self._removeFromIndex(self.rsvpIndex, username, event)
+        zip = self.indexedZip.pop(event.getName().lower(), None)
+        self._removeFromIndex(self.zipIndex, zip, event)
+        sortKey = self.indexedSortKey.pop(event.getName().lower(), None)
+        if (sortKey):
+            self._removeSorted(self.dateIndex, sortKey)
+        tagMask = self.indexedTagMask.pop(event.getName().lower(), 0)
+        for tag in VALID_TAGS:
+            if (tagMask & TAG_BITS[tag]):
+                self._removeFromIndex(self.tagIndex, tag, event)
+        self.indexedPopularKey.pop(event.getName().lower(), None)
+        self.indexedExpiry.pop(event.getName().lower(), None)
+        for trigram in self._trigrams(event.getName().lower()):
+            if (trigram in self.trigramIndex):
+                self.trigramIndex[trigram].discard(event.getName().lower())
+                if (len(self.trigramIndex[trigram]) == 0):
+                    del self.trigramIndex[trigram]
+
+    # Add event to the events stored under key in index
+    def _addToIndex(self, index: Dict[str, Dict[str, EventData]], key: str, event: EventData) -> None:
+        if (not key in index):
+            index[key] = {}
+        index[key][event.getName().lower()] = event
+
+    # Remove event from the events stored under key in index
+    def _removeFromIndex(self, index: Dict[str, Dict[str, EventData]], key: str, event: EventData) -> None:
+        if (key in index):
+            index[key].pop(event.getName().lower(), None)
+            if (index[key] == {}):
+                del index[key]
+
+    # Returns every 3 letter piece of text
+    def _trigrams(self, text: str) -> Set[str]:
+        return set([text[i:i + 3] for i in range(len(text) - 2)])
+
+    # Push event's new place in the popularity heap after its number of RSVPs changed (the old entry becomes stale)
+    def _updatePopularity(self, event: EventData) -> None:
+        oldKey = self.indexedPopularKey[event.getName().lower()]
+        newKey = (-event.getRSVPNum(), oldKey[1], oldKey[2])
+        if (not newKey == oldKey):
+            self._pushPopular(newKey)
+
+    # Push key to the popularity heap as the event's current entry
+    def _pushPopular(self, key: Tuple[int, int, str]) -> None:
+        heapq.heappush(self.popularHeap, key)
+        self.indexedPopularKey[key[2]] = key
+        # Rebuild the heap once most of its entries are stale
+        if (len(self.popularHeap) > 2 * len(self.indexedPopularKey) + 16):
+            popularHeap = list(self.indexedPopularKey.values())
+            heapq.heapify(popularHeap)
+            self.popularHeap = popularHeap
+
+    # Remove the entry starting with key from a sorted index
+    def _removeSorted(self, index: list, key: tuple) -> None:
+        i = bisect.bisect_left(index, key)
+        if (i < len(index) and index[i][:len(key)] == key):
+            del index[i]
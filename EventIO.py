@@ -6,7 +6,7 @@
 #
 #                                     Data Members:
 # 
-# EventData, newData, oldData, eventName, eventTime, eventLocation, eventZIP, eventDate,
+# EventData, newData, oldIndex, oldNames, eventName, eventTime, eventLocation, eventZIP, eventDate,
 # eventRecurring, eventTags, eventSummary, eventRSVP.
 #
 #
@@ -14,32 +14,61 @@
 #                                      Methods:
 # "init": The class' "constructor".
 #
-# "getOldData": Passes data for old or passed/inactive events.
+# "getOldData": Reads every old or passed/inactive event from the archive file.
 #
-# "setOldData": Sets data for old or passed/inactive events.
+# "getOldEvent": Reads a single old event matching a name from the archive file.
+#
+# "getOldEvents": Reads a page of old events (sorted by date, time, then name) from the archive file.
+#
+# "getOldEventCount": Returns the number of old events in the archive file.
+#
+# "archiveEvents": Appends events to the archive file.
+#
+# "indexOldData": Builds the indexes of where each old event starts in the archive file.
 #
 # "loadData": Passes event data from our "database" into an object
-# for storage in memory.
+# for storage in memory. Old events are only read when requested.
 #
 # "readData": Opens the "database" and inserts data from events into a list.
 #
 # "saveData": Passes event data from object in memory to the databse file.
 #
 # "writeData": Writes the data from the list into the database file.
+#
+# "record____": Appends a single change (RSVP join/leave, new, remove, replace, retire)
+# to the journal file instead of rewriting the database files.
+#
+# "recordRetireEvents": Appends several retired events with one write to each file.
+#
+# "replayJournal": Applies the changes stored in the journal to the loaded data, stopping at
+# an entry left incomplete by a crash.
+#
+# "compact": Writes the current data to the database files and clears the journal.
 
 import os
-from typing import List
+from array import array
+from typing import BinaryIO, Callable, Iterator, List, TextIO, Tuple
 from DataIO import DataIO
 from dataClasses.EventData import EventData
 
 # Data is stored as a list of EventData objects
+# Changes are appended to a journal file, which is compacted into the database files
+# once it holds journalLimit entries (and on every startup)
+# Old events are never held in memory, only indexes of their byte offsets in OldEvents.txt
+# (8 bytes per event in each index, keys are read from the file when searching)
 class EventIO(DataIO):
     filePath = DataIO.databasePath + DataIO.eventFilename
     filePathOld = DataIO.databasePath + DataIO.oldEventFilename
+    filePathJournal = DataIO.databasePath + DataIO.eventJournalFilename
+    journalLimit = 100
 
     def __init__(self):
         super().__init__()
-        self.oldData = []
+        self.journalCount = 0
+        # Offsets of the old events sorted by (date, time, name, offset), built on first use
+        self.oldIndex: array = None
+        # Offsets of the old events sorted by (lowercase name, offset), built on first use
+        self.oldNames: array = None
         self.onStartup()
     
     # Check if files exist, make them if not
@@ -50,100 +79,336 @@ class EventIO(DataIO):
         if (not os.path.exists(self.filePathOld)):
             newFile = open(self.filePathOld, 'w')
             newFile.close()
+        if (not os.path.exists(self.filePathJournal)):
+            newFile = open(self.filePathJournal, 'w')
+            newFile.close()
 
-    # Get method for data stored in OldData (inactive events)
+    # Read every old event (inactive events) from file, in file order
     def getOldData(self) -> List[EventData]:
-        return self.oldData
+        oldData = []
+        self._readData(self.filePathOld, oldData)
+        return oldData
+
+    # Returns the first old event matching given name (None if not found)
+    def getOldEvent(self, name: str) -> EventData:
+        self.indexOldData()
+        with open(self.filePathOld, 'rb') as inFile:
+            nameKey = lambda offset: (self._readOldKey(inFile, offset)[2].lower(), offset)
+            position = self._bisectOffsets(self.oldNames, (name.lower(), -1), nameKey)
+            if (position == len(self.oldNames)):
+                return None
+            offset = self.oldNames[position]
+            if (not nameKey(offset)[0] == name.lower()):
+                return None
+        return self._readOldEvents([offset])[0]
+
+    # Returns count old events starting at start, sorted by date, time, then name
+    def getOldEvents(self, start: int, count: int) -> List[EventData]:
+        self.indexOldData()
+        return self._readOldEvents(self.oldIndex[start:start + count])
 
-    # Set method for data stored in oldData (inactive events)
-    def setOldData(self, newData: List[EventData]) -> None:
-        self.oldData = newData
+    # Returns number of old events
+    def getOldEventCount(self) -> int:
+        self.indexOldData()
+        return len(self.oldIndex)
+
+    # Append events to the old events file
+    def archiveEvents(self, events: List[EventData]) -> None:
+        offsets = []
+        with open(self.filePathOld, 'a') as outFile:
+            for event in events:
+                offsets.append(outFile.tell())
+                self._writeEvent(event, outFile)
+        if (not self.oldIndex == None):
+            self._addOldIndex(offsets)
+
+    # Build the indexes of old events from the first line of each event in the file
+    # Only the first call reads the file, archiveEvents keeps the indexes up to date
+    def indexOldData(self) -> None:
+        if (not self.oldIndex == None):
+            return
+        keys = []
+        with open(self.filePathOld, 'rb') as inFile:
+            offset = 0
+            lineNum = 0
+            for line in inFile:
+                if (lineNum % 3 == 0):
+                    keys.append(self._oldKey(line.decode()) + (offset,))
+                offset = offset + len(line)
+                lineNum = lineNum + 1
+        # Only the sorted offsets are kept
+        keys.sort()
+        self.oldIndex = array('q', [key[3] for key in keys])
+        keys = [(key[2].lower(), key[3]) for key in keys]
+        keys.sort()
+        self.oldNames = array('q', [key[1] for key in keys])
+
+    # Add old events starting at each offset to the indexes (the events must be written to the file)
+    def _addOldIndex(self, offsets: List[int]) -> None:
+        with open(self.filePathOld, 'rb') as inFile:
+            dateKey = lambda offset: self._readOldKey(inFile, offset) + (offset,)
+            nameKey = lambda offset: (self._readOldKey(inFile, offset)[2].lower(), offset)
+            for offset in offsets:
+                self.oldIndex.insert(self._bisectOffsets(self.oldIndex, dateKey(offset), dateKey), offset)
+                self.oldNames.insert(self._bisectOffsets(self.oldNames, nameKey(offset), nameKey), offset)
+
+    # Returns the position of the first offset in sorted offsets with keyOf(offset) >= key
+    def _bisectOffsets(self, offsets: array, key: tuple, keyOf: Callable[[int], tuple]) -> int:
+        low = 0
+        high = len(offsets)
+        while (low < high):
+            middle = (low + high) // 2
+            if (keyOf(offsets[middle]) < key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Returns (date, time, name) of the old event starting at offset in the open old events file
+    def _readOldKey(self, inFile: BinaryIO, offset: int) -> Tuple[str, str, str]:
+        inFile.seek(offset)
+        return self._oldKey(inFile.readline().decode())
+
+    # Returns (date, time, name) from the first line of an old event
+    def _oldKey(self, line: str) -> Tuple[str, str, str]:
+        line = line.strip().split()
+        return (line[2], line[1], line[0].replace('_', ' '))
+
+    # Read the old events starting at each offset in the file
+    def _readOldEvents(self, offsets: List[int]) -> List[EventData]:
+        events = []
+        with open(self.filePathOld, 'rb') as inFile:
+            for offset in offsets:
+                inFile.seek(offset)
+                lines = [inFile.readline().decode() for i in range(3)]
+                events.append(self._readEvent(lines[0], iter(lines[1:])))
+        return events
 
     # Load Event data from file to memory in object
+    # Any changes left in the journal are applied, then compacted into the database files
+    # (compacting also drops an entry left incomplete by a crash, so later entries are not appended after it)
     def loadData(self) -> None:
         self._readData(self.filePath, self.data)
-        self._readData(self.filePathOld, self.oldData)
+        self.replayJournal()
+        if (os.path.getsize(self.filePathJournal) > 0):
+            self.compact()
 
     # Open file and read data to list
     def _readData(self, filePath: str, appendList: List[EventData]) -> None:
         with open(filePath, 'r') as inFile:
             for line in inFile:
-                line = line.strip().split()
-
-                # Replace any '_' with ' '
-                line = [entry.replace('_', ' ') for entry in line]
-
-                # Separate the line into relevant categories
-                eventName = line.pop(0)
-                eventTime = line.pop(0)
-                eventDate = line.pop(0)
-                eventLocation = line.pop(0)
-                eventZip = line.pop(0)
-                eventRecurring = line.pop(0)
-                eventTags = line
-                if (not eventTags == "No Tags"):
-                    eventTags = [entry.replace(' ', '_') for entry in eventTags]
-                
-                # Get next line of organizer and RSVPs
-                eventRSVP = next(inFile).strip().split()
-
-                # Get next line of Summary
-                eventSummary = next(inFile).strip()
-                
-                # Add new EventData object to this object's data list
-                # appendList.append(EventData(eventName, eventTime, eventDate, eventLocation, eventZip, eventTags, eventRSVP, eventSummary))
-                event = EventData.EventBuilder(eventName, eventDate, eventRSVP[0], eventRecurring).Time(eventTime).Location(eventLocation).Zip(eventZip).Summary(eventSummary)
-                if (not eventTags == "No Tags"):
-                    event.Tags(eventTags)
-                if (not eventRSVP[1:] == []):
-                    event.RSVP(eventRSVP[1:])
-                event = event.build()
-                appendList.append(event)
+                appendList.append(self._readEvent(line, inFile))
+
+    # Read one event (3 lines) from file, starting with the already read first line
+    def _readEvent(self, line: str, inFile: TextIO) -> EventData:
+        line = line.strip().split()
+
+        # Replace any '_' with ' '
+        line = [entry.replace('_', ' ') for entry in line]
+
+        # Separate the line into relevant categories
+        eventName = line.pop(0)
+        eventTime = line.pop(0)
+        eventDate = line.pop(0)
+        eventLocation = line.pop(0)
+        eventZip = line.pop(0)
+        eventRecurring = line.pop(0)
+        eventTags = line
+        if (not eventTags == "No Tags"):
+            eventTags = [entry.replace(' ', '_') for entry in eventTags]
+        
+        # Get next line of organizer and RSVPs
+        eventRSVP = next(inFile).strip().split()
+
+        # Get next line of Summary
+        eventSummary = next(inFile).strip()
+        
+        # Build new EventData object from the separated data (without an EventBuilder per event)
+        return EventData.fromFields(eventName, eventDate, eventTime, eventLocation, eventZip, eventRecurring,
+                                    eventTags, eventRSVP[0], eventRSVP[1:], eventSummary)
 
     # Save Event data to file from memory in object
+    # Old events are written as they are retired (see archiveEvents)
     def saveData(self) -> None:
         self._writeData(self.filePath, self.data)
-        self._writeData(self.filePathOld, self.oldData)
         
+    # Written to a temporary file first, so a crash never leaves the file half written
     def _writeData(self, filePath: str, outList: List[EventData]) -> None:
-        with open(filePath, 'w') as outFile:
+        with open(filePath + ".tmp", 'w') as outFile:
             for event in outList:
-                # Create a list with name, time, date, location, and tags
-                line = []
-                line.append(event.getName())
-                line.append(event.getTimeStr())
-                line.append(event.getDateStr())
-                line.append(event.getLocation())
-                line.append(event.getZip())
-                line.append(event.getRecurring())
-                tags = event.getTagStrs()
-                if (not tags == []):
-                    for tag in tags:
-                        line.append(tag)
-
-                # Replace any ' ' with '_'
-                line = [entry.replace(' ', '_') for entry in line]
-
-                
-
-                # Convert to single line string
-                line = ' '.join(line)
-
-                # Print line to file
-                print(line, file=outFile)
-
-                # Repeat with organizer and RSVP
-                line = []
-                line.append(event.getOrganizer())
-                eventRSVP = event.getRSVP()
-                if (not eventRSVP == []):
-                    for user in eventRSVP:
-                        line.append(user)
-                line = ' '.join(line)
-                print(line, file=outFile)
-
-                # Print summary directly to file
-                print(event.getSummary(), file=outFile)
+                self._writeEvent(event, outFile)
+            outFile.flush()
+            os.fsync(outFile.fileno())
+        os.replace(filePath + ".tmp", filePath)
+
+    # Write one event (3 lines) to file
+    def _writeEvent(self, event: EventData, outFile: TextIO) -> None:
+        # Print line with name, time, date, location, and tags to file
+        print(self._eventLine(event), file=outFile)
+
+        # Repeat with organizer and RSVP
+        line = []
+        line.append(event.getOrganizer())
+        eventRSVP = event.getRSVP()
+        if (not eventRSVP == []):
+            for user in eventRSVP:
+                line.append(user)
+        line = ' '.join(line)
+        print(line, file=outFile)
+
+        # Print summary directly to file
+        print(event.getSummary(), file=outFile)
+
+    # Returns the first line of an event in file (name, time, date, location, and tags)
+    def _eventLine(self, event: EventData) -> str:
+        # Create a list with name, time, date, location, and tags
+        line = []
+        line.append(event.getName())
+        line.append(event.getTimeStr())
+        line.append(event.getDateStr())
+        line.append(event.getLocation())
+        line.append(event.getZip())
+        line.append(event.getRecurring())
+        tags = event.getTagStrs()
+        if (not tags == []):
+            for tag in tags:
+                line.append(tag)
+
+        # Replace any ' ' with '_'
+        line = [entry.replace(' ', '_') for entry in line]
+
+        # Convert to single line string
+        return ' '.join(line)
+
+    # Write the current data to the database files and clear the journal
+    # The journal is only cleared once the new file is in place (replaying it again is harmless)
+    def compact(self) -> None:
+        self.saveData()
+        newFile = open(self.filePathJournal, 'w')
+        newFile.close()
+        self.journalCount = 0
+
+    # Journal entries start with a line of "<action> <event name>", followed by
+    # the username (RSVP changes) or the full event (new/replace/retire)
+    def recordAddRSVP(self, eventName: str, username: str) -> None:
+        self._appendJournal("addRSVP", eventName, username)
+
+    def recordRemoveRSVP(self, eventName: str, username: str) -> None:
+        self._appendJournal("removeRSVP", eventName, username)
+
+    def recordNewEvent(self, event: EventData) -> None:
+        self._appendJournal("new", event.getName(), events=[event])
+
+    def recordRemoveEvent(self, event: EventData) -> None:
+        self._appendJournal("remove", event.getName())
+
+    def recordReplaceEvent(self, event: EventData) -> None:
+        self._appendJournal("replace", event.getName(), events=[event])
+
+    # nextEvent is the new occurrence of a recurring event (None if not recurring)
+    # The event is added to the old events file before the journal entry is written
+    def recordRetireEvent(self, event: EventData, nextEvent: EventData=None) -> None:
+        self.recordRetireEvents([(event, nextEvent)])
+
+    # Records several retired events with one write to the old events file and one to the journal
+    # retired is a list of (event, nextEvent) in the order the events were retired
+    def recordRetireEvents(self, retired: List[Tuple[EventData, EventData]]) -> None:
+        if (retired == []):
+            return
+        self.archiveEvents([event for event, nextEvent in retired])
+        entries = []
+        for event, nextEvent in retired:
+            if (nextEvent):
+                entries.append(("retire", event.getName(), "1", [nextEvent]))
+            else:
+                entries.append(("retire", event.getName(), "0", []))
+        self._appendJournalEntries(entries)
+
+    # Append one entry to the journal, compacting if the journal is full
+    def _appendJournal(self, action: str, eventName: str, argument: str="", events: List[EventData]=None) -> None:
+        if (events == None):
+            events = []
+        self._appendJournalEntries([(action, eventName, argument, events)])
+
+    # Append entries (action, event name, argument, events) to the journal, compacting if the journal is full
+    def _appendJournalEntries(self, entries: List[Tuple[str, str, str, List[EventData]]]) -> None:
+        with open(self.filePathJournal, 'a') as outFile:
+            for action, eventName, argument, events in entries:
+                line = [action, eventName.replace(' ', '_')]
+                if (argument):
+                    line.append(argument)
+                print(' '.join(line), file=outFile)
+                for event in events:
+                    self._writeEvent(event, outFile)
+        self.journalCount = self.journalCount + len(entries)
+        if (self.journalCount >= self.journalLimit):
+            self.compact()
+
+    # Apply every change stored in the journal to the loaded data
+    # Mirrors the changes made by EventHandler, returns the number of entries applied
+    # Replay stops at the first incomplete entry (the end of the journal was not written before a crash)
+    def replayJournal(self) -> int:
+        count = 0
+        with open(self.filePathJournal, 'r') as inFile:
+            lines = inFile.read().split('\n')
+        # The last piece is empty if the journal ends with a full line, otherwise it was cut off
+        inLines = iter(lines[:-1])
+        for line in inLines:
+            try:
+                self._replayEntry(line, inLines)
+            except (StopIteration, IndexError, ValueError):
+                break
+            count = count + 1
+        self.journalCount = count
+        return count
+
+    # Apply one journal entry starting with the given line (lines of the event are read from inLines)
+    # Entries can be replayed on data that already has them (a crash between compact's write and
+    # clearing the journal), so "new" skips events that already exist
+    def _replayEntry(self, line: str, inLines: Iterator[str]) -> None:
+        line = line.strip().split()
+        if (line == []):
+            return
+        action = line[0]
+        eventName = line[1].replace('_', ' ')
+        if (action == "addRSVP"):
+            event = self._findEvent(eventName)
+            if (event):
+                event.addRSVP(line[2])
+        elif (action == "removeRSVP"):
+            event = self._findEvent(eventName)
+            if (event):
+                event.removeRSVP(line[2])
+        elif (action == "new"):
+            newEvent = self._readEvent(next(inLines), inLines)
+            if (not self._findEvent(newEvent.getName())):
+                self.data.append(newEvent)
+        elif (action == "remove"):
+            event = self._findEvent(eventName)
+            if (event):
+                self.data.remove(event)
+        elif (action == "replace"):
+            newEvent = self._readEvent(next(inLines), inLines)
+            event = self._findEvent(eventName)
+            if (event):
+                self.data.remove(event)
+                self.data.append(newEvent)
+        elif (action == "retire"):
+            nextEvent = None
+            if (line[2] == "1"):
+                nextEvent = self._readEvent(next(inLines), inLines)
+            event = self._findEvent(eventName)
+            if (event):
+                if (nextEvent):
+                    self.data.append(nextEvent)
+                self.data.remove(event)
+
+    # Returns the first active event matching the given name
+    def _findEvent(self, eventName: str) -> EventData:
+        for event in self.data:
+            if event.isEventname(eventName):
+                return event
+        return None
 
 if __name__=="__main__":
     events = EventIO()
@@ -0,0 +1,209 @@
+#                                     Summary:
+#
+# This class stores the event data in the SQLite database. It has the same methods as
+# EventIO, but each change is written as a single row instead of rewriting every event.
+#
+#
+#
+#                                     Data Members:
+#
+# data, connection
+#
+#
+#
+#                                      Methods:
+#
+# "createTables": Creates the events and rsvp tables and their indexes.
+#
+# "loadData": Reads the active events from the database.
+#
+# "saveData": Replaces every active event in the database with the events in memory.
+#
+# "getOldData": Reads every old event from the database.
+#
+# "getOldEvent": Reads a single old event from the database.
+#
+# "getOldEvents": Reads a page of old events (sorted by date, time, then name) from the database.
+#
+# "getOldEventCount": Returns the number of old events in the database.
+#
+# "archiveEvents": Writes events to the database as old events.
+#
+# "record____": Writes a single change (RSVP join/leave, new, remove, replace, retire)
+# to the database.
+#
+# "recordRetireEvents": Writes several retired events in one transaction.
+
+from typing import List, Tuple
+from SQLiteIO import SQLiteIO
+from dataClasses.EventData import EventData
+
+# Data is stored as a list of EventData objects
+# Events are kept in the "events" table (archived = 1 for old events), with RSVPs in the "rsvp" table
+class EventSQLiteIO(SQLiteIO):
+    # Create tables and indexes if they do not exist
+    # Time is stored as Central Time ("HH:MM" or "TBD"), tags as a space separated string
+    # Position keeps the order of the events, like the order of the lines in Events.txt
+    def createTables(self) -> None:
+        with self.lock:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    time TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    zip TEXT NOT NULL,
+                    recurring TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    organizer TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    archived INTEGER NOT NULL,
+                    position INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS eventsNameIndex ON events (lower(name), archived);
+                CREATE INDEX IF NOT EXISTS eventsOrganizerIndex ON events (lower(organizer));
+                CREATE INDEX IF NOT EXISTS eventsZipIndex ON events (zip);
+                CREATE INDEX IF NOT EXISTS eventsDateIndex ON events (date, time);
+                CREATE INDEX IF NOT EXISTS eventsPositionIndex ON events (position);
+                CREATE TABLE IF NOT EXISTS rsvp (
+                    eventId INTEGER NOT NULL,
+                    username TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (eventId, username)
+                );
+                CREATE INDEX IF NOT EXISTS rsvpUsernameIndex ON rsvp (username);
+            """)
+
+    # Load Event data from database to memory in object
+    # Old events are only read when requested
+    def loadData(self) -> None:
+        self.data = self._selectEvents("WHERE archived = 0 ORDER BY position")
+
+    # Save Event data to database from memory in object (replaces every active event)
+    def saveData(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM rsvp WHERE eventId IN (SELECT id FROM events WHERE archived = 0)")
+            self.connection.execute("DELETE FROM events WHERE archived = 0")
+            for event in self.data:
+                self._insertEvent(event, 0)
+
+    # Read every old event (inactive events) from database, in the order they were archived
+    def getOldData(self) -> List[EventData]:
+        return self._selectEvents("WHERE archived = 1 ORDER BY position")
+
+    # Returns the first old event matching given name (None if not found)
+    def getOldEvent(self, name: str) -> EventData:
+        events = self._selectEvents("WHERE lower(name) = ? AND archived = 1 ORDER BY position LIMIT 1", (name.lower(),))
+        if (events == []):
+            return None
+        return events[0]
+
+    # Returns count old events starting at start, sorted by date, time, then name
+    def getOldEvents(self, start: int, count: int) -> List[EventData]:
+        return self._selectEvents("WHERE archived = 1 ORDER BY date, time, name LIMIT ? OFFSET ?", (count, start))
+
+    # Returns number of old events
+    def getOldEventCount(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM events WHERE archived = 1").fetchone()[0]
+
+    # Write events to database as old events
+    def archiveEvents(self, events: List[EventData]) -> None:
+        with self.lock, self.connection:
+            for event in events:
+                self._insertEvent(event, 1)
+
+    def recordAddRSVP(self, eventName: str, username: str) -> None:
+        with self.lock, self.connection:
+            eventId = self._activeEventId(eventName)
+            position = self.connection.execute("SELECT IFNULL(MAX(position), 0) + 1 FROM rsvp WHERE eventId = ?", (eventId,)).fetchone()[0]
+            self.connection.execute("INSERT OR IGNORE INTO rsvp (eventId, username, position) VALUES (?, ?, ?)", (eventId, username, position))
+
+    def recordRemoveRSVP(self, eventName: str, username: str) -> None:
+        with self.lock, self.connection:
+            eventId = self._activeEventId(eventName)
+            self.connection.execute("DELETE FROM rsvp WHERE eventId = ? AND username = ?", (eventId, username))
+
+    def recordNewEvent(self, event: EventData) -> None:
+        with self.lock, self.connection:
+            self._insertEvent(event, 0)
+
+    def recordRemoveEvent(self, event: EventData) -> None:
+        with self.lock, self.connection:
+            self._deleteEvent(self._activeEventId(event.getName()))
+
+    def recordReplaceEvent(self, event: EventData) -> None:
+        with self.lock, self.connection:
+            self._deleteEvent(self._activeEventId(event.getName()))
+            self._insertEvent(event, 0)
+
+    # nextEvent is the new occurrence of a recurring event (None if not recurring)
+    def recordRetireEvent(self, event: EventData, nextEvent: EventData=None) -> None:
+        self.recordRetireEvents([(event, nextEvent)])
+
+    # Records several retired events in one transaction
+    # retired is a list of (event, nextEvent) in the order the events were retired
+    def recordRetireEvents(self, retired: List[Tuple[EventData, EventData]]) -> None:
+        with self.lock, self.connection:
+            for event, nextEvent in retired:
+                eventId = self._activeEventId(event.getName())
+                self.connection.execute("UPDATE events SET archived = 1, position = ? WHERE id = ?", (self._nextPosition(), eventId))
+                if (nextEvent):
+                    self._insertEvent(nextEvent, 0)
+
+    # Returns the row id of the active event matching given name
+    def _activeEventId(self, eventName: str) -> int:
+        row = self.connection.execute("SELECT id FROM events WHERE lower(name) = ? AND archived = 0", (eventName.lower(),)).fetchone()
+        if (row == None):
+            return None
+        return row[0]
+
+    # Returns the position after the last event (read from the end of eventsPositionIndex)
+    def _nextPosition(self) -> int:
+        return self.connection.execute("SELECT IFNULL(MAX(position), 0) + 1 FROM events").fetchone()[0]
+
+    # Insert event and its RSVP list (must be called inside a transaction)
+    def _insertEvent(self, event: EventData, archived: int) -> None:
+        tags = [tag.replace(' ', '_') for tag in event.getTagStrs()]
+        cursor = self.connection.execute(
+            "INSERT INTO events (name, time, date, location, zip, recurring, tags, organizer, summary, archived, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.getName(), event.getTimeStr(), event.getDateStr(), event.getLocation(), event.getZip(), event.getRecurring(),
+             ' '.join(tags), event.getOrganizer(), event.getSummary(), archived, self._nextPosition())
+        )
+        eventId = cursor.lastrowid
+        self.connection.executemany("INSERT INTO rsvp (eventId, username, position) VALUES (?, ?, ?)",
+                                    [(eventId, username, position) for position, username in enumerate(event.getRSVP())])
+
+    # Delete event and its RSVP list (must be called inside a transaction)
+    def _deleteEvent(self, eventId: int) -> None:
+        self.connection.execute("DELETE FROM rsvp WHERE eventId = ?", (eventId,))
+        self.connection.execute("DELETE FROM events WHERE id = ?", (eventId,))
+
+    # Returns events selected by the given clause (WHERE, ORDER BY and LIMIT of the events table)
+    def _selectEvents(self, clause: str, parameters: tuple=()) -> List[EventData]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, name, time, date, location, zip, recurring, tags, organizer, summary FROM events " + clause,
+                parameters
+            ).fetchall()
+            rsvpRows = self.connection.execute(
+                "SELECT eventId, username FROM rsvp WHERE eventId IN (SELECT id FROM events " + clause + ") ORDER BY position",
+                parameters
+            ).fetchall()
+
+        # Group RSVP usernames by event
+        rsvp = {}
+        for eventId, username in rsvpRows:
+            rsvp.setdefault(eventId, []).append(username)
+
+        events = []
+        for eventId, name, time, date, location, zip, recurring, tags, organizer, summary in rows:
+            events.append(EventData.fromFields(name, date, time, location, zip, recurring, tags.split(), organizer, rsvp.get(eventId, []), summary))
+        return events
+
+if __name__=="__main__":
+    events = EventSQLiteIO()
+    events.loadData()
+    for event in events.getData():
+        event.printAllData()
@@ -43,7 +43,10 @@
 #
 # "editEvent": Allows the user to edit events they organized/has edit privilages for.
 #
-# "setTasks": Sets up a program to call and run the "checkActive" method every 12 hours.
+# "setTasks": Starts the task planner (see TaskPlanner), which runs "runDueTasks" when an event
+# retires or needs a notification, and plans again whenever an event is created, edited or retired.
+#
+# "runDueTasks": Runs "checkActive" and the notification tasks.
 #
 # "checkActive": Checks to see if events are still active and removes out of date
 # events.
@@ -53,16 +56,28 @@
 #
 # "oneDayNotification": Examines every event and sends out email notifications for those starting
 # within 24 hours.
+#
+# "reminderDigests": Sends the one day and one week notifications together, one email per user
+# (used instead of "oneDayNotification" and "oneWeekNotification" when EMAIL_DIGEST is True).
+#
+# "asset": Serves a static file by its hashed filename (see AssetManifest), with headers
+# that let browsers keep it for a year without checking for changes.
+#
+# "cachedPage": Decorator for pages that only change when an event or user changes. Serves
+# GET requests from "responseCache" and answers "If-None-Match" with 304 Not Modified.
 
 # Flask Website: "Main"
 import os
-from flask import Flask, request, session, redirect, url_for
-from flask_apscheduler import APScheduler, scheduler
-from datetime import date
+import functools
+import hashlib
+from flask import Flask, request, session, redirect, url_for, make_response, send_from_directory, abort
+from datetime import date, datetime, timedelta, timezone
 from ProcessManager import ProcessManager
 from HTMLPages import HTMLPages
 from EmailHandler import EmailHandler
-from dataClasses.extras import DATABASE_PATH, USER_IMAGES, EVENT_IMAGES
+from FragmentCache import FragmentCache
+from TaskPlanner import TaskPlanner
+from dataClasses.extras import RESPONSE_CACHE_SIZE, STATIC_PATH, ASSET_MAX_AGE, EMAIL_DIGEST, PLANNER_MAX_SLEEP
 
 app = Flask(__name__)
 app.secret_key = "secure"
@@ -70,19 +85,61 @@ app.secret_key = "secure"
 hostName = "127.0.0.1"
 port = 8080
 
-# For automatic timed scripts (removing out-of-date events)
-scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
-
 PManager = ProcessManager()
-pages = HTMLPages()
+pages = HTMLPages(PManager.getEventImages(), PManager.getUserImages(), PManager.getAssets())
 EmHandler = EmailHandler(hostName + ':' + str(port))
 
 dateObj = date
 
+# Whole pages: (data generation, path, query args, username) -> (HTML, ETag)
+responseCache = FragmentCache(RESPONSE_CACHE_SIZE)
+
+# Caches the page returned by a route until an event or user changes
+# Pages are kept per logged in user (None if not logged in), since the header and buttons differ
+# Responses have a strong ETag (hash of the HTML) so browsers can revalidate and get a 304
+# Logged in users' pages are marked private, so shared caches (proxies) never store them
+def cachedPage(route):
+    @functools.wraps(route)
+    def cachedRoute():
+        if (not request.method == "GET"):
+            return route()
+        args = tuple(sorted(request.args.items(multi=True)))
+        key = (PManager.getDataGeneration(), request.path, args, session.get("Username"))
+        page = responseCache.get(key)
+        if (page == None):
+            html = route()
+            # Redirects and other responses are not cached
+            if (not isinstance(html, str)):
+                return html
+            page = (html, hashlib.sha256(html.encode()).hexdigest())
+            responseCache.put(key, page)
+        response = make_response(page[0])
+        response.set_etag(page[1])
+        response.cache_control.no_cache = True
+        if (session.get("Username")):
+            response.cache_control.private = True
+        return response.make_conditional(request)
+    return cachedRoute
+
+# Static files by hashed filename (e.g. /assets/css/style.<hash>.css)
+# The hash changes with the file's contents, so the response can be cached as immutable
+@app.route("/assets/<path:filename>")
+def asset(filename: str):
+    assetName = PManager.getAssets().getAssetName(filename)
+    if (assetName == None):
+        abort(404)
+    # The cache time is set on the response, send_from_directory's argument for it differs between Flask versions
+    response = send_from_directory(STATIC_PATH, assetName)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.expires = datetime.now(timezone.utc) + timedelta(seconds=ASSET_MAX_AGE)
+    return response
+
 # Index/Home Page
 @app.route("/", methods=["GET", "POST"])
+@cachedPage
 def index():
     popularEvents = PManager.getPopularEvents()
     return pages.indexHTML(popularEvents)
@@ -147,8 +204,7 @@ def newAccount():
         if ("image" in request.files):
             imageFile = request.files["image"]
             if (PManager.allowedImageFile(imageFile.filename)):
-                imageName = PManager.getNextUserImgName(username)
-                imageFile.save(DATABASE_PATH + USER_IMAGES + imageName)
+                PManager.saveUserImg(username, imageFile)
             else:
                 return pages.newAccountHTML(badImage=True)
         
@@ -175,8 +231,7 @@ def editAccount():
             imageFile = request.files["image"]
             if (imageFile):
                 if (PManager.allowedImageFile(imageFile.filename)):
-                    imageName = PManager.getNextUserImgName(username)
-                    imageFile.save(DATABASE_PATH + USER_IMAGES + imageName)
+                    PManager.saveUserImg(username, imageFile)
                 else:
                     return pages.editAccountHTML(badImage=True)
         
@@ -188,27 +243,34 @@ def editAccount():
 # Events Page: Displays all events by default
 # Search at top of page: Changes what events get displayed
 @app.route("/events/", methods=["GET", "POST"])
+@cachedPage
 def events():
     if ("searchValue" not in request.args):
         eventList = PManager.getAllEvents()
+        tagCounts = PManager.getTagCounts()
     elif (request.method == "GET"):
         searchType = request.args.get("searchType")
         searchValue = request.args.get("searchValue")
         searchDate = request.args.get("searchDate")
         searchTags = request.args.getlist("tags")
         eventList = PManager.searchEvents(searchType, searchValue, searchDate, searchTags)
+        tagCounts = PManager.getTagCounts(eventList)
     
     if ("Username" in session):
         user = PManager.passUsername(session["Username"])
-        return pages.eventsHTML(eventList, user=user)
+        return pages.eventsHTML(eventList, user=user, tagCounts=tagCounts)
     else:
-        return pages.eventsHTML(eventList)
+        return pages.eventsHTML(eventList, tagCounts=tagCounts)
 
-# Event Archive: Displays out-of-date events
+# Event Archive: Displays out-of-date events, one page at a time
 @app.route("/eventArchive/", methods=["GET", "POST"])
+@cachedPage
 def eventArchive():
-    eventList = PManager.getOldEvents()
-    return pages.eventArchiveHTML(eventList)
+    pageCount = PManager.getOldEventPageCount()
+    page = request.args.get("page", 0, type=int)
+    page = min(max(page, 0), pageCount - 1)
+    eventList = PManager.getOldEvents(page)
+    return pages.eventArchiveHTML(eventList, page, pageCount)
 
 # Event Details: Displays a single event's details
 # Allows joining/leaving an event
@@ -236,6 +298,7 @@ def eventDetails():
 # Event Details Archived: Displays an archived event's details
 # Does not allow editing event in any way (join/leave/delete)
 @app.route("/eventDetailsArchived/", methods=["GET", "POST"])
+@cachedPage
 def eventDetailsArchived():
     eventName = request.args.get("name")
     event = PManager.getOldEvent(eventName)
@@ -261,8 +324,7 @@ def newEvent():
             imageFile = request.files["image"]
             if (imageFile):
                 if (PManager.allowedImageFile(imageFile.filename)):
-                    imageName = PManager.getNextEventImgName(name)
-                    imageFile.save(DATABASE_PATH + EVENT_IMAGES + imageName)
+                    PManager.saveEventImg(name, imageFile)
                 else:
                     todayStr = dateObj.today().strftime("%Y-%m-%d")
                     return pages.newEventHTML(todayStr, badImage=True)
@@ -299,8 +361,7 @@ def editEvent():
             imageFile = request.files["image"]
             if (imageFile):
                 if (PManager.allowedImageFile(imageFile.filename)):
-                    imageName = PManager.getNextEventImgName(eventName)
-                    imageFile.save(DATABASE_PATH + EVENT_IMAGES + imageName)
+                    PManager.saveEventImg(eventName, imageFile)
                 else:
                     return pages.editEventHTML(event, badImage=True)
         if (PManager.passEditEvent(eventName, reset, time, location, zip, tags, summary)):
@@ -351,14 +412,22 @@ def sendInvites():
             invited.append(user)
     return pages.sendInvitesHTML(eventName, invited)
 
-# Sets up APScheduler to run checkActive() every 12 hours
+# Starts the task planner, which runs the timed tasks at once, then whenever an event retires or
+# enters a notification window (PManager.getNextDueTime). Event changes make it work out the due time again
 def setTasks():
-    # app.apscheduler.add_job(func=checkActive, trigger="interval", hours=12, id="checkActiveTask") # For actual use, 12 hour intervals
-    app.apscheduler.add_job(func=checkActive, trigger="interval", seconds=10, id="checkActiveTask") # For debug use, 10 second intervals
-    # app.apscheduler.add_job(func=oneDayNotifications, trigger="interval", hours=12, id="sendOneDayNotificationTask") # For actual use, 12 hour intervals
-    app.apscheduler.add_job(func=oneDayNotifications, trigger="interval", seconds=10, id="sendOneDayNotificationTask") # For debug use, 10 second intervals
-    # app.apscheduler.add_job(func=oneWeekNotifications, trigger="interval", hours=12, id="sendOneWeekNotificationTask") # For debug use, 12 hour intervals
-    app.apscheduler.add_job(func=oneWeekNotifications, trigger="interval", seconds=10, id="sendOneWeekNotificationTask") # For debug use, 10 second intervals
+    PManager.addEventChangeListener(lambda event: planner.replan())
+    planner.start()
+
+# Runs the timed tasks (each only does work for the events that are due)
+def runDueTasks() -> None:
+    checkActive()
+    if (EMAIL_DIGEST):
+        reminderDigests()
+    else:
+        oneDayNotifications()
+        oneWeekNotifications()
+
+planner = TaskPlanner(runDueTasks, PManager.getNextDueTime, PLANNER_MAX_SLEEP)
 
 # Checks all events and removes out-of-date events
 def checkActive() -> None:
@@ -376,6 +445,7 @@ def oneDayNotifications() -> None:
     for event in events:
         rsvp = PManager.passGetRSVP(event)
         EmHandler.oneDayNotification(event, rsvp)
+    logOutbox()
 
 # Checks all events and sends notifications for those starting within 1 week
 def oneWeekNotifications() -> None:
@@ -383,12 +453,23 @@ def oneWeekNotifications() -> None:
     for event in events:
         rsvp = PManager.passGetRSVP(event)
         EmHandler.oneWeekNotification(event, rsvp)
+    logOutbox()
+
+# Checks all events and sends the one day and one week reminders due, as one digest email per user
+def reminderDigests() -> None:
+    reminders = [("oneDayNotification", event, PManager.passGetRSVP(event)) for event in PManager.getOneDayEvents()]
+    reminders.extend(("oneWeekNotification", event, PManager.passGetRSVP(event)) for event in PManager.getOneWeekEvents())
+    EmHandler.sendReminderDigests(reminders)
+    logOutbox()
+
+# Logs the emails waiting in the outbox and when they are projected to be sent (at the send rate limits)
+def logOutbox() -> None:
+    stats = EmHandler.getOutboxStats()
+    if (stats["queued"] > 0):
+        app.logger.info(f"Email outbox: {stats['queued']} queued, projected to be sent by {EmHandler.getProjectedCompletion():%Y-%m-%d %H:%M:%S}")
 
 if __name__=="__main__":
     updateNotificationsSent()
     setTasks()
-    checkActive()
-    oneDayNotifications()
-    oneWeekNotifications()
     app.run(host=hostName, port=port, debug=True)
     # app.run(host=hostName, port=port)
\ No newline at end of file
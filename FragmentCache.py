@@ -0,0 +1,68 @@
+#                                     Summary:
+#
+# This class is a bounded cache of rendered HTML fragments (event cards, or whole pages
+# with their ETag). When the cache is full, the fragment used longest ago is removed (least
+# recently used). It counts hits and misses so the cache size can be checked against real traffic.
+#
+#
+#
+#                                     Data Members:
+#
+# maxSize, fragments, hits, misses, lock
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", sets the maximum number of fragments.
+#
+# "get": Returns the fragment stored under a key (None if not cached).
+#
+# "put": Stores a fragment under a key, removing the least recently used fragment if full.
+#
+# "clear": Removes every fragment.
+#
+# "getStats": Returns the number of hits, misses and stored fragments.
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+class FragmentCache:
+    def __init__(self, maxSize: int):
+        self.maxSize = maxSize
+        # Fragments in order of use, least recently used first
+        self.fragments: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Pages are rendered from several Flask threads
+        self.lock = threading.Lock()
+
+    # Returns the fragment stored under key and marks it as recently used (None if not cached)
+    def get(self, key: Hashable) -> Any:
+        with self.lock:
+            fragment = self.fragments.get(key)
+            if (fragment == None):
+                self.misses = self.misses + 1
+                return None
+            self.fragments.move_to_end(key)
+            self.hits = self.hits + 1
+            return fragment
+
+    # Store fragment under key, removing the least recently used fragments if the cache is full
+    def put(self, key: Hashable, fragment: Any) -> None:
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while (len(self.fragments) > self.maxSize):
+                self.fragments.popitem(last=False)
+
+    # Remove every fragment (counters are kept)
+    def clear(self) -> None:
+        with self.lock:
+            self.fragments.clear()
+
+    # Returns {"hits": ..., "misses": ..., "size": ...}
+    def getStats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.fragments)}
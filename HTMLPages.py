@@ -6,12 +6,17 @@
 #
 #                                            Data Members:
 #
-# retHTML, name, date, time, location, ZIP, tags, day, recurring, summary
+# retHTML, name, date, time, location, ZIP, tags, day, recurring, summary, cardCache,
+# eventImages, userImages, assets
 #
 #
 #
 #                                             Methods:
 #
+# "init": Creates the cache of rendered event cards and keeps the image manifests
+# (see ImageManifest) used to find each event's and user's current image, and the asset
+# manifest (see AssetManifest) used for the URLs of the stylesheet and images.
+#
 # "wrapHTML": Formats the HTML string with the default common header and footer.
 #
 # "indexHTML": Returns the HTML templates plus the render.
@@ -34,6 +39,12 @@
 #
 # "eventShortArchive": Loads HTML for the short event archive page.
 #
+# "eventGridHTML": Renders each event card once and lays the cards out in the grid and
+# two column tables in one template render (used by the short event and archive pages).
+#
+# "eventCardHTML": Returns an event's rendered card, reusing cards stored in "cardCache"
+# (see FragmentCache) until the event changes.
+#
 # "eventDetailedHTML": Loads HTML for the detailed event page.
 #
 # "eventDetailedArchiveHTML": Loads HTML for the detailed event archive page.
@@ -43,22 +54,44 @@
 # "newEventHTML": Loads HTML for the event creation page.
 #
 # "editEventHTML": Loads HTML for the event edit page.
-#
-# "getCurrentEventImgName": Method returns the image associated with the current event.
-#
-# "getCurrentUserImgName": This returns the image attached to the logged in user.
 
-import os
-from flask import render_template, session, request, url_for
-from typing import List
+from flask import current_app, render_template, session, request, url_for
+from markupsafe import Markup
+from typing import List, NamedTuple
 from dataClasses.EventData import EventData
 from dataClasses.UserData import UserData
-from dataClasses.extras import CSS_PATH, VALID_TAGS, DISPLAY_TAGS, NUM_TAGS, DATABASE_PATH, USER_IMAGES, EVENT_IMAGES, STATIC_PATH
+from dataClasses.extras import VALID_TAGS, DISPLAY_TAGS, NUM_TAGS, USER_IMAGES, EVENT_IMAGES, CARD_CACHE_SIZE, STYLESHEET
+from FragmentCache import FragmentCache
+from ImageManifest import ImageManifest
+from AssetManifest import AssetManifest
+
+# Values shown on an event card
+class EventView(NamedTuple):
+    name: str
+    date: str
+    time: str
+    location: str
+    tags: List[str]
+
+# Values shown for a user in an RSVP list
+class UserView(NamedTuple):
+    username: str
+    phone: str
+    email: str
 
 class HTMLPages:
+    def __init__(self, eventImages: ImageManifest, userImages: ImageManifest, assets: AssetManifest):
+        # Rendered event cards, shared by every page that shows event grids
+        self.cardCache = FragmentCache(CARD_CACHE_SIZE)
+        # Current image of each event and user
+        self.eventImages = eventImages
+        self.userImages = userImages
+        # Hashed URLs of the stylesheet and images
+        self.assets = assets
+
     # Wraps input HTML string with common header and footer
     def _wrapHTML(self, inHTML: bool):
-        stylesheet = self._getCurrentStylesheetName()
+        stylesheet = self.assets.getURL(STYLESHEET)
         return (render_template("header.html", loggedIn=("Username" in session), style=stylesheet) 
                 + inHTML 
                 + render_template("footer.html"))
@@ -78,15 +111,15 @@ class HTMLPages:
         retHTML = render_template("snippets/accountEventOrganizer.html", isUser=isUser)
         retHTML = retHTML + self._eventShortGridHTML(userEvents)
         retHTML = retHTML + render_template("snippets/endSection.html")
-        imageName = self._getCurrentUserImgName(user.getUsername())
-        imageName = USER_IMAGES + imageName
+        imageName = self.assets.getURL(USER_IMAGES + self.userImages.getCurrentImgName(user.getUsername()))
+        hasImage = self.userImages.hasImage(user.getUsername())
         if (isUser):
             retHTML = render_template("pages/accountPrivate.html",
                                        username=user.getUsername(),
                                        phone=user.getPhone(),
                                        email=user.getEmail(),
                                        image=imageName,
-                                       hasImage=os.path.isfile(DATABASE_PATH + imageName),
+                                       hasImage=hasImage,
                                        zip=user.getZip(),
                                        hasZip=user.hasZip()
                                      ) + retHTML
@@ -97,7 +130,7 @@ class HTMLPages:
             retHTML = render_template("pages/accountPublic.html",
                                        username=user.getUsername(),
                                        image=imageName,
-                                       hasImage=os.path.isfile(DATABASE_PATH + imageName)
+                                       hasImage=hasImage
                                      ) + retHTML
         return self._wrapHTML(retHTML)
 
@@ -110,7 +143,7 @@ class HTMLPages:
     def accountDNEHTML(self, accountName: str):
         return self._wrapHTML(render_template("pages/accountDNE.html", username=accountName))
 
-    def eventsHTML(self, eventList: List[EventData], searching: str="all", user: UserData=None):
+    def eventsHTML(self, eventList: List[EventData], searching: str="all", user: UserData=None, tagCounts: List[int]=None):
         zip = None
         showNear = False
         if (user and user.hasZip()):
@@ -129,6 +162,7 @@ class HTMLPages:
                                        searchDate=date,
                                        searchValue=text,
                                        tags=tags,
+                                       tagCounts=tagCounts,
                                        zip=zip,
                                        showNear=showNear
                                      )
@@ -141,6 +175,7 @@ class HTMLPages:
                                        searchDate="",
                                        searchValue="",
                                        tags=[],
+                                       tagCounts=tagCounts,
                                        zip=zip,
                                        showNear=showNear
                                      )
@@ -148,75 +183,45 @@ class HTMLPages:
         return self._wrapHTML(retHTML)
 
     def _eventShortHTML(self, eventList: List[EventData]):
-        retHTML = ""
-        for event in eventList:
-            retHTML = retHTML + render_template("snippets/eventShort.html", 
-                                                 name=event.getName(), 
-                                                 date=event.getDateStr(), 
-                                                 time=event.getTimeStr(), 
-                                                 location=event.getLocation(), 
-                                                 tags=event.getTagStrs()
-                                               )
-        return retHTML
+        return render_template("snippets/eventShortList.html", events=self._eventViews(eventList))
 
     def _eventShortGridHTML(self, eventList: List[EventData]):
-        gridHTML = render_template("snippets/eventGridStart.html")
-        columnHTML = render_template("snippets/eventColumnStart.html")
-        eventCount = 1
-        for event in eventList:
-            gridHTML = gridHTML + render_template("snippets/eventShortGrid.html", 
-                                                   name=event.getName(), 
-                                                   date=event.getDateStr(), 
-                                                   time=event.getTimeStr(), 
-                                                   location=event.getLocation(), 
-                                                   tags=event.getTagStrs(),
-                                                   endRow=eventCount%3 == 0
-                                                 )
-            columnHTML = columnHTML + render_template("snippets/eventShortGrid.html", 
-                                                       name=event.getName(), 
-                                                       date=event.getDateStr(), 
-                                                       time=event.getTimeStr(), 
-                                                       location=event.getLocation(), 
-                                                       tags=event.getTagStrs(),
-                                                       endRow=eventCount%2 == 0
-                                                     )
-            eventCount = eventCount + 1
-        gridHTML = gridHTML + render_template("snippets/eventTableEnd.html")
-        columnHTML = columnHTML + render_template("snippets/eventTableEnd.html")
-        retHTML = gridHTML + columnHTML
-        return retHTML
+        return self._eventGridHTML("snippets/eventShortGrid.html", eventList)
 
-    def eventArchiveHTML(self, eventList: List[EventData]):
+    def eventArchiveHTML(self, eventList: List[EventData], page: int=0, pageCount: int=1):
         retHTML = render_template("pages/eventArchive.html")
         retHTML = retHTML + self._eventShortArchivedHTML(eventList)
+        if (pageCount > 1):
+            retHTML = retHTML + render_template("snippets/archivePages.html", page=page, pageCount=pageCount)
         return self._wrapHTML(retHTML)
     
     def _eventShortArchivedHTML(self, eventList: List[EventData]):
-        gridHTML = render_template("snippets/eventGridStart.html")
-        columnHTML = render_template("snippets/eventColumnStart.html")
-        eventCount = 1
-        for event in eventList:
-            gridHTML = gridHTML + render_template("snippets/eventShortArchived.html", 
-                                                   name=event.getName(), 
-                                                   date=event.getDateStr(), 
-                                                   time=event.getTimeStr(), 
-                                                   location=event.getLocation(), 
-                                                   tags=event.getTagStrs(),
-                                                   endRow=eventCount%3 == 0
-                                                 )
-            columnHTML = columnHTML + render_template("snippets/eventShortArchived.html", 
-                                                       name=event.getName(), 
-                                                       date=event.getDateStr(), 
-                                                       time=event.getTimeStr(), 
-                                                       location=event.getLocation(), 
-                                                       tags=event.getTagStrs(),
-                                                       endRow=eventCount%2 == 0
-                                                     )
-            eventCount = eventCount + 1
-        gridHTML = gridHTML + render_template("snippets/eventTableEnd.html")
-        columnHTML = columnHTML + render_template("snippets/eventTableEnd.html")
-        retHTML = gridHTML + columnHTML
-        return retHTML
+        return self._eventGridHTML("snippets/eventShortArchived.html", eventList, archived=True)
+
+    # Renders each event's card once, then lays the same cards out in both the grid
+    # and the two column table with a single render of "snippets/eventGrid.html"
+    def _eventGridHTML(self, cardTemplate: str, eventList: List[EventData], archived: bool=False):
+        cards = [self._eventCardHTML(cardTemplate, event, archived) for event in eventList]
+        return render_template("snippets/eventGrid.html", cards=cards)
+
+    # Returns the rendered card of an event, from the card cache if it has not changed since it was rendered
+    # Active cards are keyed by the event's version, archived events never change so they are keyed by their data
+    def _eventCardHTML(self, cardTemplate: str, event: EventData, archived: bool) -> Markup:
+        if (archived):
+            key = (cardTemplate, event.getName(), event.getDateStr(), event.getTimeStr(), event.getLocation(), tuple(event.getTagStrs()))
+        else:
+            key = (cardTemplate, event.getName(), event.getVersion())
+        card = self.cardCache.get(key)
+        if (card == None):
+            view = self._eventViews([event])[0]
+            card = Markup(current_app.jinja_env.get_template(cardTemplate).render(view._asdict()))
+            self.cardCache.put(key, card)
+        return card
+
+    # Returns the values shown on each event's card
+    def _eventViews(self, eventList: List[EventData]) -> List[EventView]:
+        return [EventView(event.getName(), event.getDateStr(), event.getTimeStr(), event.getLocation(), event.getTagStrs())
+                for event in eventList]
 
     def eventDetailedHTML(self, event: EventData, trueRSVP: List[UserData]):
         if ("Username" in session):
@@ -224,8 +229,7 @@ class HTMLPages:
         else:
             username = ""
         isOrganizer = (event.isOrganizerName(username))
-        imageName = self._getCurrentEventImgName(event.getName())
-        imageName = EVENT_IMAGES + imageName
+        imageName = self.assets.getURL(EVENT_IMAGES + self.eventImages.getCurrentImgName(event.getName()))
         retHTML = render_template("pages/eventDetails.html", 
                                    name=event.getName(), 
                                    date=event.getDateStr(),
@@ -235,10 +239,10 @@ class HTMLPages:
                                    tags=event.getTagStrs(),
                                    summary=event.getSummary(),
                                    isOrganizer=isOrganizer,
-                                   inEvent=(username in event.getRSVP()),
+                                   inEvent=event.hasUserRSVP(username),
                                    loggedIn=("Username" in session),
                                    image=imageName,
-                                   hasImage=os.path.isfile(DATABASE_PATH + imageName)
+                                   hasImage=self.eventImages.hasImage(event.getName())
                                  )
         if (isOrganizer):
             retHTML = retHTML + self._RSVPHTML(trueRSVP)
@@ -283,14 +287,8 @@ class HTMLPages:
         return self._wrapHTML(retHTML)
     
     def _RSVPHTML(self, RSVP: List[UserData]):
-        retHTML = ""
-        for user in RSVP:
-            retHTML = retHTML + render_template("snippets/userRSVP.html",
-                                                 username=user.getUsername(),
-                                                 phone=user.getPhone(),
-                                                 email=user.getEmail()
-                                               )
-        return retHTML
+        users = [UserView(user.getUsername(), user.getPhone(), user.getEmail()) for user in RSVP]
+        return render_template("snippets/userRSVPList.html", users=users)
     
     def newEventHTML(self, todayStr: str, badName: bool=False, badImage: bool=False):
         if (request.form):
@@ -343,40 +341,3 @@ class HTMLPages:
                                                numTags=NUM_TAGS,
                                                badImage=badImage)
                                              )
-    
-    def _getCurrentEventImgName(self, eventName: str) -> str:
-        eventPath = DATABASE_PATH + EVENT_IMAGES
-        version = 0
-        baseName = eventName + ".jpg"
-        imageName = baseName + str(version)
-        while(os.path.isfile(eventPath + imageName)):
-            version = version + 1
-            imageName = baseName + str(version)
-        version = version - 1
-        imageName = baseName + str(version)
-        return imageName
-
-    def _getCurrentUserImgName(self, username: str) -> str:
-        userPath = DATABASE_PATH + USER_IMAGES
-        version = 0
-        baseName = username + ".jpg"
-        imageName = baseName + str(version)
-        while(os.path.isfile(userPath + imageName)):
-            version = version + 1
-            imageName = baseName + str(version)
-        version = version - 1
-        imageName = baseName + str(version)
-        return imageName
-    
-    def _getCurrentStylesheetName(self) -> str:
-        version = 1
-        baseName = STATIC_PATH + CSS_PATH
-        stylePath = baseName + "style.css"
-        if (not os.path.isfile(baseName + "style" + str(version) + ".css")):
-            return CSS_PATH + "style" + ".css"
-        while(os.path.isfile(stylePath)):
-            stylePath = baseName + "style" + str(version) + ".css"
-            version = version + 1
-        version = version - 2
-        stylePath = CSS_PATH + "style" + str(version) + ".css"
-        return stylePath
\ No newline at end of file
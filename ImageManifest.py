@@ -0,0 +1,112 @@
+#                                     Summary:
+#
+# This class keeps track of the uploaded images in one image folder (event or user images).
+# Images are saved as <name>.jpg0, <name>.jpg1, ... and the newest one is shown. The folder is
+# read once when the manifest is created, after that finding an image is a dictionary lookup.
+# The manifest can also be saved to a file in the folder, so the folder is not read at startup.
+#
+#
+#
+#                                     Data Members:
+#
+# folderPath, manifestPath, versions, lock
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", loads the manifest file or reads the image folder.
+#
+# "scanFolder": Finds the number of images saved for each name in the image folder.
+#
+# "loadManifest": Reads the number of images saved for each name from the manifest file.
+#
+# "saveManifest": Writes the number of images saved for each name to the manifest file.
+#
+# "hasImage": Returns True if an image was saved for the name.
+#
+# "getCurrentImgName": Returns the filename of the newest image saved for the name.
+#
+# "getNextImgName": Returns the filename to save the next image for the name under.
+#
+# "saveImage": Saves an uploaded image under the next filename and records it.
+
+import os
+import re
+import threading
+from typing import Dict
+from werkzeug.datastructures import FileStorage
+
+class ImageManifest:
+    # Image filenames are <name>.jpg<version>
+    imagePattern = re.compile(r"^(.*)\.jpg(\d+)$")
+
+    # manifestFile is the file (in the image folder) the manifest is saved to, None to always read the folder
+    def __init__(self, folderPath: str, manifestFile: str=None):
+        self.folderPath = folderPath
+        self.manifestPath = None
+        if (manifestFile):
+            self.manifestPath = folderPath + manifestFile
+        # Name -> number of images saved (versions 0 to number - 1)
+        self.versions: Dict[str, int] = {}
+        # Images are uploaded from several Flask threads
+        self.lock = threading.Lock()
+        if (self.manifestPath and os.path.isfile(self.manifestPath)):
+            self.loadManifest()
+        else:
+            self.scanFolder()
+            if (self.manifestPath):
+                self.saveManifest()
+
+    # Count the images saved for each name in the image folder
+    # Only versions 0, 1, 2, ... without gaps are counted, a version after a gap is never shown
+    def scanFolder(self) -> None:
+        saved: Dict[str, set] = {}
+        if (os.path.isdir(self.folderPath)):
+            for filename in os.listdir(self.folderPath):
+                match = self.imagePattern.match(filename)
+                if (match):
+                    saved.setdefault(match.group(1), set()).add(int(match.group(2)))
+        self.versions = {}
+        for name, versions in saved.items():
+            count = 0
+            while (count in versions):
+                count = count + 1
+            if (count > 0):
+                self.versions[name] = count
+
+    # Read the manifest file, one "<number of images> <name>" line per name
+    def loadManifest(self) -> None:
+        self.versions = {}
+        with open(self.manifestPath, 'r') as inFile:
+            for line in inFile:
+                count, name = line.rstrip('\n').split(' ', 1)
+                self.versions[name] = int(count)
+
+    # Write the manifest file, one "<number of images> <name>" line per name
+    def saveManifest(self) -> None:
+        with open(self.manifestPath, 'w') as outFile:
+            for name, count in self.versions.items():
+                print(f"{count} {name}", file=outFile)
+
+    # Returns True if an image has been saved for name
+    def hasImage(self, name: str) -> bool:
+        return name in self.versions
+
+    # Returns the filename of the newest image for name (<name>.jpg-1 if there is no image)
+    def getCurrentImgName(self, name: str) -> str:
+        return name + ".jpg" + str(self.versions.get(name, 0) - 1)
+
+    # Returns the filename the next image for name is saved as
+    def getNextImgName(self, name: str) -> str:
+        return name + ".jpg" + str(self.versions.get(name, 0))
+
+    # Save an uploaded image as the next image for name, returns the filename it was saved as
+    def saveImage(self, name: str, imageFile: FileStorage) -> str:
+        with self.lock:
+            imageName = self.getNextImgName(name)
+            imageFile.save(self.folderPath + imageName)
+            self.versions[name] = self.versions.get(name, 0) + 1
+            if (self.manifestPath):
+                self.saveManifest()
+        return imageName
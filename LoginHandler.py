@@ -7,7 +7,7 @@
 #
 #                                                    Data Members:
 #
-# user
+# user, generation
 #
 #
 #
@@ -16,6 +16,8 @@
 # "init": This is the class' constructor method, it initializes and makes calls to the 
 # other classes.
 #
+# "getGeneration": Returns a number that increases every time a user is added or changed.
+#
 # "getUser": Checks for a user object that matches the login attempt, and returns it if found.
 #
 # "newUser": Creates a new user object by storing the input in the database list.
@@ -27,48 +29,50 @@
 # "isValidLogin": Returns "true" if the inputted username and password match.
 
 from UserIO import UserIO
+from UserSQLiteIO import UserSQLiteIO
 from dataClasses.UserData import UserData
+from dataClasses.extras import STORAGE_BACKEND
 
 class LoginHandler:
     def __init__(self):
-        self.objIO = UserIO()
+        if (STORAGE_BACKEND == "sqlite"):
+            self.objIO = UserSQLiteIO()
+        else:
+            self.objIO = UserIO()
         self.objIO.loadData()
-        self.users = self.objIO.getData()
+        # Increased by every change to the users (used to tell when cached pages are out of date)
+        self.generation = 0
+
+    # Returns the number of changes made to the users since loading
+    def getGeneration(self) -> int:
+        return self.generation
 
     # Return user object that matches given username
     def getUser(self, username: str) -> UserData:
-        for user in self.users:
-            if (user.isUsername(username)):
-                return user
-        return None
+        return self.objIO.getUser(username)
 
-    # Takes as input a new UserData object, store it in users list, then save to file
+    # Takes as input a new UserData object, stores it, then saves it
     # Returns True if user is created
     def newUser(self, newUserData: UserData) -> bool:
         # Check if user already exists (same exact username)
-        for user in self.users:
-            if (user.isUser(newUserData)):
-                return False
+        if (self.objIO.getUser(newUserData.getUsername())):
+            return False
 
-        self.users.append(newUserData)
-        self.objIO.setData(self.users)
-        self.objIO.saveData()
+        self.objIO.addUser(newUserData)
+        self.generation = self.generation + 1
         return True
 
-    # Replace matching user in memory with input user (matches by username), then save to file
+    # Replace matching user with input user (matches by username), then save it
     # Returns True if user is replaced
     def replaceUser(self, newUser: UserData) -> bool:
-        for user in self.users:
-            if (user.isUser(newUser)):
-                user = newUser
-                self.objIO.setData(self.users)
-                self.objIO.saveData()
-                return True
-        return False
+        if (not self.objIO.updateUser(newUser)):
+            return False
+        self.generation = self.generation + 1
+        return True
 
     # Return True if given username and password match
     def isValidLogin(self, username: str, password: str) -> bool:
-        for user in self.users:
-            if (user.isUsername(username)):
-                return user.checkPassword(password)
+        user = self.objIO.getUser(username)
+        if (user):
+            return user.checkPassword(password)
         return None
\ No newline at end of file
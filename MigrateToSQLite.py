@@ -0,0 +1,53 @@
+#                                     Summary:
+#
+# This script copies the text file database (database/Events.txt, OldEvents.txt and
+# Userdata.txt) into the SQLite database. Run it once, then set STORAGE_BACKEND to
+# "sqlite" in dataClasses/extras.py.
+#
+#
+#
+#                                      Methods:
+#
+# "removeDatabase": Deletes the SQLite database file so the migration starts empty.
+#
+# "migrateEvents": Copies the active and old events to the SQLite database.
+#
+# "migrateUsers": Copies the users to the SQLite database.
+
+import os
+from SQLiteIO import SQLiteIO
+from EventIO import EventIO
+from UserIO import UserIO
+from EventSQLiteIO import EventSQLiteIO
+from UserSQLiteIO import UserSQLiteIO
+
+# Delete the SQLite database (and its WAL files) if it exists
+def removeDatabase() -> None:
+    for filePath in [SQLiteIO.filePath, SQLiteIO.filePath + "-wal", SQLiteIO.filePath + "-shm"]:
+        if (os.path.exists(filePath)):
+            os.remove(filePath)
+
+# Copy active and old events
+def migrateEvents() -> None:
+    oldIO = EventIO()
+    oldIO.loadData()
+    oldData = oldIO.getOldData()
+    newIO = EventSQLiteIO()
+    newIO.setData(oldIO.getData())
+    newIO.saveData()
+    newIO.archiveEvents(oldData)
+    print(f"Events: {len(oldIO.getData())} active, {len(oldData)} old")
+
+# Copy users (replaces any users already in the SQLite database)
+def migrateUsers() -> None:
+    oldIO = UserIO()
+    oldIO.loadData()
+    newIO = UserSQLiteIO()
+    newIO.setData(oldIO.getData())
+    newIO.saveData()
+    print(f"Users: {len(oldIO.getData())}")
+
+if __name__=="__main__":
+    removeDatabase()
+    migrateEvents()
+    migrateUsers()
@@ -6,7 +6,7 @@
 #
 #                                           Data Members:
 #
-# EHandler, LHandler
+# EHandler, LHandler, eventImages, userImages, assets, windowChangeTime
 #
 #
 #
@@ -36,6 +36,9 @@
 #
 # "passCheckActive":Passes events to the checkActive method.
 #
+# "getDataGeneration": Returns the event and user generations, which change whenever any
+# event or user is changed.
+#
 # "getEvent": Returns the event info.
 #
 # "getOldEvents": Gets info for old events.
@@ -43,36 +46,64 @@
 # "getAllEvents": Gets info for all events, and sorts them by chronological
 # order.
 #
-# "getOldEvents": Gets info for all passed events, and sorts them by chronological
-# order.
+# "getOldEvents": Gets info for one page of passed events, in chronological order.
+#
+# "getOldEventPageCount": Gets the number of pages of passed events.
 #
-# "getPopularEvents": Gets info for the three events with the most RSVPs.
+# "getPopularEvents": Gets info for the POPULAR_EVENT_COUNT events with the most RSVPs.
 #
 # "getOneDayEvents": Gets info for all events starting within 24 hours.
 #
-# "searchEvents": Searches for events by specified parameters.
+# "getNextDueTime": Returns when the next event retires or needs a one day or one week
+# notification, so the timed tasks only run when something is due (now if an event was created
+# or edited inside a notification window since the tasks last ran).
+#
+# "addEventChangeListener": Registers a function called when events are created, removed,
+# edited or retired by a user.
+#
+# "searchEvents": Searches for events by specified parameters. Searches by tags alone are
+# read from the tag index.
 #
 # "searchEventsRSVP": Searches for events that have a specified user RSVP'd.
 #
+# "getTagCounts": Gets the number of events with each tag, for the search form.
+#
 # "allowImageFile": Returns true if the image uploaded is allowed.
 #
 # "getNextEventImgName": Gets the name for the image associated with a given event.
 #
 # "getNextUserImageName": Gets the name of the next image associated with a specified user.
+#
+# "saveEventImg"/"saveUserImg": Saves an uploaded image as the next image of an event/user.
+#
+# "getEventImages"/"getUserImages": Returns the ImageManifest of the event/user images.
+#
+# "getAssets": Returns the AssetManifest (hashed filenames) of the stylesheets and images.
 
-import os
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
 from EventHandler import EventHandler
 from LoginHandler import LoginHandler
-from dataClasses.EventData import EventData
+from ImageManifest import ImageManifest
+from AssetManifest import AssetManifest
+from dataClasses.EventData import EventData, tagsToMask
 from dataClasses.UserData import UserData
-from dataClasses.extras import DATABASE_PATH, EVENT_IMAGES, USER_IMAGES
+from dataClasses.extras import DATABASE_PATH, EVENT_IMAGES, USER_IMAGES, ARCHIVE_PAGE_SIZE, IMAGE_MANIFEST_FILE, STATIC_PATH, CSS_PATH, IMAGE_PATH
+from werkzeug.datastructures import FileStorage
 
 class ProcessManager:
     def __init__(self):
         self.EHandler = EventHandler()
         self.LHandler = LoginHandler()
+        # Current image of each event and user (image folders are only read here)
+        self.eventImages = ImageManifest(DATABASE_PATH + EVENT_IMAGES, IMAGE_MANIFEST_FILE)
+        self.userImages = ImageManifest(DATABASE_PATH + USER_IMAGES, IMAGE_MANIFEST_FILE)
+        # Hashed filenames of the stylesheets and images (static folders are only read here)
+        self.assets = AssetManifest(STATIC_PATH, [CSS_PATH, IMAGE_PATH])
+        # First time an event was created or edited inside a notification window since the timed tasks
+        # last ran (None if none was), the notifications are due then
+        self.windowChangeTime: datetime = None
+        self.EHandler.addChangeListener(self._eventChanged)
 
     # Takes login input from web page and passes it to LoginHandler
     def passLogin(self, username: str, password: str) -> bool:
@@ -97,6 +128,11 @@ class ProcessManager:
             user.setZip(zip)
         return self.LHandler.replaceUser(user)
 
+    # Returns (event generation, user generation), changes whenever an event or user is changed
+    # Pages built from the same generation show the same data
+    def getDataGeneration(self) -> Tuple[int, int]:
+        return (self.EHandler.getGeneration(), self.LHandler.getGeneration())
+
     # Takes user input from web page and passes it to EventHandler
     def passRSVP(self, username: str, eventName: str) -> bool:
         return self.EHandler.addRSVP(username, eventName)
@@ -146,7 +182,9 @@ class ProcessManager:
     def passRemEvent(self, event: EventData) -> bool:
         return self.EHandler.removeEvent(event)
         
+    # The timed tasks run checkActive first, so events changed before now are notified by this run
     def passCheckActive(self) -> List[EventData]:
+        self.windowChangeTime = None
         return self.EHandler.checkActive()
 
     # Returns the named event
@@ -157,19 +195,19 @@ class ProcessManager:
     def getOldEvent(self, name: str) -> EventData:
         return self.EHandler.getOldEvent(name)
 
-    # Returns all events after sorting by chronological order
+    # Returns all events in chronological order (kept sorted by EventHandler)
     def getAllEvents(self) -> List[EventData]:
-        retEvents = self.EHandler.getAllEvents().copy()
-        retEvents.sort()
-        return retEvents
+        return self.EHandler.getSortedEvents()
     
-    # Returns all out-of-date events after sorting by chronological order
-    def getOldEvents(self) -> List[EventData]:
-        retEvents = self.EHandler.getOldEvents().copy()
-        retEvents.sort()
-        return retEvents
+    # Returns one page of out-of-date events (already in chronological order)
+    def getOldEvents(self, page: int=0) -> List[EventData]:
+        return self.EHandler.getOldEvents(page * ARCHIVE_PAGE_SIZE, ARCHIVE_PAGE_SIZE)
+
+    # Returns number of pages of out-of-date events (at least 1)
+    def getOldEventPageCount(self) -> int:
+        return max(1, -(-self.EHandler.getOldEventCount() // ARCHIVE_PAGE_SIZE))
     
-    # Returns 3 popular events (highest # RSVP's)
+    # Returns POPULAR_EVENT_COUNT popular events (highest # RSVP's)
     def getPopularEvents(self) -> List[EventData]:
         return self.EHandler.searchPopular()
 
@@ -181,9 +219,42 @@ class ProcessManager:
     def getOneWeekEvents(self) -> List[EventData]:
         return self.EHandler.getOneWeekEvents()
 
+    # Returns the next time an event retires or enters the one day or one week notification window
+    # (None if nothing is due). Events already in a window are notified when the tasks run, and an
+    # event enters a window at midnight, 1 day (getOneDayEvents) or 6 days (getOneWeekEvents) before its date
+    def getNextDueTime(self) -> datetime:
+        today = datetime.today().date()
+        dueTimes = []
+        if (self.windowChangeTime):
+            dueTimes.append(self.windowChangeTime)
+        nextExpiry = self.EHandler.getNextExpiry()
+        if (nextExpiry):
+            dueTimes.append(nextExpiry)
+        for windowDays in [1, 6]:
+            nextDate = self.EHandler.getFirstDateAfter(today + timedelta(days=windowDays))
+            if (nextDate):
+                dueTimes.append(datetime.combine(nextDate - timedelta(days=windowDays), datetime.min.time()))
+        return min(dueTimes, default=None)
+
+    # Call listener after every event is created, removed, edited or retired by a user (see EventHandler.addChangeListener)
+    def addEventChangeListener(self, listener: Callable[[EventData], None]) -> None:
+        self.EHandler.addChangeListener(listener)
+
+    # Notifications are due now if the new or edited event is already inside a notification window (today to 6 days ahead)
+    def _eventChanged(self, event: EventData) -> None:
+        if (event == None or not self.windowChangeTime == None):
+            return
+        today = datetime.today().date()
+        if (today.strftime("%Y-%m-%d") <= event.getSortKey()[0] <= (today + timedelta(days=6)).strftime("%Y-%m-%d")):
+            self.windowChangeTime = datetime.now()
+
     # Return appropriate search results
     def searchEvents(self, searchType: str, searchValue: str, searchDate: str="", searchTags: List[str]=[""]) -> List[EventData]:
-        if (searchType == "name"):
+        if (searchType == "name" and searchValue == "" and not searchTags in ([""], []) and not tagsToMask(searchTags) == None):
+            # Every event matches an empty name, so only the tags narrow the search (read from the tag index)
+            retEvents = self.EHandler.searchTags(searchTags)
+            searchTags = [""]
+        elif (searchType == "name"):
             retEvents = self.EHandler.searchName(searchValue)
         elif (searchType == "organizer"):
             retEvents = self.EHandler.searchOrganizer(searchValue)
@@ -197,14 +268,18 @@ class ProcessManager:
         if (not searchTags == [""]):
             retEvents = self.EHandler.refineSearchTags(retEvents, searchTags)
 
-        retEvents.sort()
+        retEvents.sort(key=EventData.getSortKey)
         return retEvents
 
+    # Returns number of events with each tag (all active events if eventList is None)
+    def getTagCounts(self, eventList: List[EventData]=None) -> List[int]:
+        return self.EHandler.countTags(eventList)
+
     # Returns events with specific user in RSVP
     def searchEventsRSVP(self, user: UserData) -> List[EventData]:
         username = user.getUsername()
         retEvents = self.EHandler.searchRSVP(username)
-        retEvents.sort()
+        retEvents.sort(key=EventData.getSortKey)
         return retEvents
     
     # Returns True if filename extension is of an allowed filetype
@@ -220,22 +295,29 @@ class ProcessManager:
     
     # Returns the next image filename (<event>.jpg# + 1) for a given event name
     def getNextEventImgName(self, eventName: str) -> str:
-        eventPath = DATABASE_PATH + EVENT_IMAGES
-        version = 0
-        baseName = eventName + ".jpg"
-        imageName = baseName + str(version)
-        while(os.path.isfile(eventPath + imageName)):
-            version = version + 1
-            imageName = baseName + str(version)
-        return imageName
+        return self.eventImages.getNextImgName(eventName)
     
     # Returns the next image filename (<event>.jpg# + 1) for a given user name
     def getNextUserImgName(self, username: str) -> str:
-        userPath = DATABASE_PATH + USER_IMAGES
-        version = 0
-        baseName = username + ".jpg"
-        imageName = baseName + str(version)
-        while(os.path.isfile(userPath + imageName)):
-            version = version + 1
-            imageName = baseName + str(version)
+        return self.userImages.getNextImgName(username)
+
+    # Saves uploaded image as the next image for a given event name, returns its filename
+    def saveEventImg(self, eventName: str, imageFile: FileStorage) -> str:
+        imageName = self.eventImages.saveImage(eventName, imageFile)
+        self.assets.addAsset(EVENT_IMAGES + imageName)
+        return imageName
+
+    # Saves uploaded image as the next image for a given user name, returns its filename
+    def saveUserImg(self, username: str, imageFile: FileStorage) -> str:
+        imageName = self.userImages.saveImage(username, imageFile)
+        self.assets.addAsset(USER_IMAGES + imageName)
         return imageName
+
+    def getEventImages(self) -> ImageManifest:
+        return self.eventImages
+
+    def getUserImages(self) -> ImageManifest:
+        return self.userImages
+
+    def getAssets(self) -> AssetManifest:
+        return self.assets
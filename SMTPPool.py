@@ -0,0 +1,157 @@
+#                                     Summary:
+#
+# This class keeps a small pool of logged in SMTP connections so emails can be sent without
+# connecting, starting TLS and logging in for every batch. Connections that sat unused are
+# checked with NOOP before use, broken connections are replaced, and each connection is
+# closed after a set number of messages (mail servers limit messages per connection).
+#
+#
+#
+#                                     Data Members:
+#
+# host, port, useSSL, username, password, size, maxMessages, keepAliveSeconds, timeout,
+# context, idle, openCount, condition
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", stores the server settings. Connections are opened when needed.
+#
+# "sendmail": Sends one message on a pooled connection, reconnecting once if the connection fails.
+#
+# "close": Closes every idle connection.
+#
+# "connect": Opens and logs in a new connection.
+#
+# "acquire"/"release": Takes a connection from the pool and returns it.
+
+import smtplib
+import ssl
+import threading
+import time
+from typing import List, Tuple
+
+class SMTPPool:
+    # keepAliveSeconds: connections unused for longer are checked with NOOP before sending
+    # maxMessages: a connection is closed (and replaced when needed) after sending this many messages
+    def __init__(self, host: str, port: int, useSSL: bool=True, username: str=None, password: str=None,
+                 size: int=2, maxMessages: int=100, keepAliveSeconds: float=30, timeout: float=30):
+        self.host = host
+        self.port = port
+        self.useSSL = useSSL
+        self.username = username
+        self.password = password
+        self.size = size
+        self.maxMessages = maxMessages
+        self.keepAliveSeconds = keepAliveSeconds
+        self.timeout = timeout
+        self.context = ssl.create_default_context()
+        # Idle connections: [(connection, messages sent, time last used), ...], most recently used last
+        self.idle: List[Tuple[smtplib.SMTP, int, float]] = []
+        # Connections currently open (idle or in use)
+        self.openCount = 0
+        self.condition = threading.Condition()
+
+    # Send one message, retrying once on a new connection if the pooled connection has failed
+    # Errors about the message itself (refused recipients, rejected data) are raised without retrying
+    def sendmail(self, sender: str, receiver: str, message: str) -> None:
+        for attempt in range(2):
+            connection, sent = self._acquire()
+            try:
+                connection.sendmail(sender, receiver, message)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                self._release(connection, sent + 1)
+                raise
+            except (smtplib.SMTPException, OSError):
+                self._discard(connection)
+                if (attempt == 1):
+                    raise
+            else:
+                self._release(connection, sent + 1)
+                return
+
+    # Close every idle connection (connections in use are closed when they are released)
+    def close(self) -> None:
+        with self.condition:
+            idle = self.idle
+            self.idle = []
+            self.openCount = self.openCount - len(idle)
+            self.condition.notify_all()
+        for connection, sent, lastUsed in idle:
+            self._quit(connection)
+
+    # Open a connection to the server and log in (if a username is set)
+    def connect(self) -> smtplib.SMTP:
+        if (self.useSSL):
+            connection = smtplib.SMTP_SSL(self.host, self.port, context=self.context, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if (self.username):
+                connection.login(self.username, self.password)
+        except Exception:
+            self._quit(connection)
+            raise
+        return connection
+
+    # Returns (connection, messages sent) from the pool, opening a connection if none are idle
+    # Waits for a connection to be released if the pool is full
+    def _acquire(self) -> Tuple[smtplib.SMTP, int]:
+        with self.condition:
+            while (not self.idle and self.openCount >= self.size):
+                self.condition.wait()
+            if (self.idle):
+                connection, sent, lastUsed = self.idle.pop()
+            else:
+                self.openCount = self.openCount + 1
+                connection = None
+        if (connection == None):
+            try:
+                return (self.connect(), 0)
+            except Exception:
+                self._forget()
+                raise
+        # Check connections that have been idle for a while, the server may have closed them
+        if (time.monotonic() - lastUsed > self.keepAliveSeconds and not self._isAlive(connection)):
+            self._quit(connection)
+            try:
+                return (self.connect(), 0)
+            except Exception:
+                self._forget()
+                raise
+        return (connection, sent)
+
+    # Return a connection to the pool, closing it once it has sent maxMessages messages
+    def _release(self, connection: smtplib.SMTP, sent: int) -> None:
+        if (sent >= self.maxMessages):
+            self._discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, sent, time.monotonic()))
+            self.condition.notify()
+
+    # Close a connection that will not be returned to the pool
+    def _discard(self, connection: smtplib.SMTP) -> None:
+        self._quit(connection)
+        self._forget()
+
+    # Stop counting a connection that was closed (or failed to open)
+    def _forget(self) -> None:
+        with self.condition:
+            self.openCount = self.openCount - 1
+            self.condition.notify()
+
+    # Returns True if the server answers NOOP on the connection
+    def _isAlive(self, connection: smtplib.SMTP) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    # Close a connection, ignoring errors from connections that are already broken
+    def _quit(self, connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
@@ -0,0 +1,45 @@
+#                                     Summary:
+#
+# This class is the base for the SQLite storage backend. It opens the SQLite database file
+# and lets its subclasses read and write single rows instead of whole files.
+#
+#
+#
+#                                     Data Members:
+#
+# connection, lock
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", opens the database and creates the tables.
+#
+# "connect": Opens the database file in WAL mode.
+#
+# "createTables": (Abstract) Creates the tables and indexes used by the subclass.
+
+import sqlite3
+import threading
+from DataIO import DataIO
+
+class SQLiteIO(DataIO):
+    filePath = DataIO.databasePath + DataIO.sqliteFilename
+
+    def __init__(self):
+        super().__init__()
+        # Flask and the scheduler use the connection from different threads
+        self.lock = threading.RLock()
+        self.connection = self.connect()
+        self.createTables()
+
+    # Open the database file in WAL mode (readers do not block the writer)
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filePath, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # (Abstract) Create the tables and indexes used by the object
+    def createTables(self) -> None:
+        pass
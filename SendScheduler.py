@@ -0,0 +1,111 @@
+#                                     Summary:
+#
+# This class decides which email EmailOutbox sends next and when. Emails are queued by group
+# (the event they are about) and sent in turn from each group, so a large event's notifications
+# do not hold up every other event's. Sending is limited by a per second and a per day token
+# bucket (see TokenBucket) to stay under the mail server's limits, and the time needed to send
+# the queued emails can be projected from the limits. The per day bucket's level is saved to a
+# file after every email, so restarting does not allow another full day of emails.
+#
+#
+#
+#                                     Data Members:
+#
+# buckets, dayBucket, statePath, queues, queuedCount
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", creates the token buckets for the given limits, restoring
+# the per day bucket from the state file.
+#
+# "push": Queues an email in its group.
+#
+# "waitTime": Returns the seconds until the limits allow the next email to be sent.
+#
+# "pop": Returns the next email to send (taking turns between groups) and uses up a token.
+#
+# "projectCompletion": Returns the seconds needed to send the queued emails and any more.
+
+import json
+import os
+from collections import deque, OrderedDict
+from typing import Deque
+from TokenBucket import TokenBucket
+
+# Not thread safe, EmailOutbox only uses it while holding its lock
+class SendScheduler:
+    # perSecond: emails sent per second (bursts of up to perSecond emails)
+    # perDay: emails sent per day (the whole day's emails can be sent at once, then one every 86400 / perDay seconds)
+    # None (or 0) for no limit
+    # statePath: file the per day bucket's level is saved to and restored from (not saved if None)
+    def __init__(self, perSecond: float=None, perDay: float=None, statePath: str=None):
+        self.buckets = []
+        if (perSecond):
+            self.buckets.append(TokenBucket(perSecond, max(1.0, perSecond)))
+        self.dayBucket = None
+        self.statePath = statePath
+        if (perDay):
+            self.dayBucket = TokenBucket(perDay / 86400, perDay)
+            self.buckets.append(self.dayBucket)
+            self._loadState()
+        # {group: deque of message ids, ...} in the order groups take turns
+        self.queues: OrderedDict[str, Deque[str]] = OrderedDict()
+        self.queuedCount = 0
+
+    def __len__(self) -> int:
+        return self.queuedCount
+
+    # Queue message id at the end of its group
+    def push(self, group: str, messageId: str) -> None:
+        if (group not in self.queues):
+            self.queues[group] = deque()
+        self.queues[group].append(messageId)
+        self.queuedCount = self.queuedCount + 1
+
+    # Returns seconds until the next message can be sent (0 if it can be sent now)
+    def waitTime(self) -> float:
+        return max([bucket.waitTime() for bucket in self.buckets], default=0.0)
+
+    # Returns the next message id (None if nothing is queued) and takes a token from each bucket
+    # Groups take turns: the group sent from moves to the back
+    def pop(self) -> str:
+        if (self.queuedCount == 0):
+            return None
+        group, queue = next(iter(self.queues.items()))
+        messageId = queue.popleft()
+        if (queue):
+            self.queues.move_to_end(group)
+        else:
+            del self.queues[group]
+        self.queuedCount = self.queuedCount - 1
+        for bucket in self.buckets:
+            bucket.take()
+        self._saveState()
+        return messageId
+
+    # Returns seconds needed to send the queued messages plus extraCount more at the allowed rate
+    def projectCompletion(self, extraCount: int=0) -> float:
+        count = self.queuedCount + extraCount
+        return max([bucket.timeFor(count) for bucket in self.buckets], default=0.0)
+
+    # Restore the per day bucket from the state file (the bucket stays full if there is none)
+    def _loadState(self) -> None:
+        if (self.statePath == None):
+            return
+        try:
+            with open(self.statePath, 'r') as inFile:
+                state = json.load(inFile)
+            self.dayBucket.setLevel(float(state["tokens"]), float(state["time"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    # Save the per day bucket's level (written to a temporary file first so a crash never leaves half a file)
+    def _saveState(self) -> None:
+        if (self.statePath == None or self.dayBucket == None):
+            return
+        tokens, savedTime = self.dayBucket.getLevel()
+        with open(self.statePath + ".tmp", 'w') as outFile:
+            json.dump({"tokens": tokens, "time": savedTime}, outFile)
+        os.replace(self.statePath + ".tmp", self.statePath)
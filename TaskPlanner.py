@@ -0,0 +1,92 @@
+#                                     Summary:
+#
+# This class runs the website's timed tasks (retiring events, sending notifications) when
+# they are due instead of on a fixed interval. It asks when the next task is due and sleeps
+# until then, waking early when the events change to ask again (a new or edited event can be
+# due sooner), and only runs the tasks once the due time is reached. The sleep is capped at
+# maxSleep seconds, so tasks run at most maxSleep seconds late if the system clock is changed
+# while sleeping. If the tasks fail they are tried again after maxSleep seconds.
+#
+#
+#
+#                                     Data Members:
+#
+# run, getNextDueTime, maxSleep, nextDueTime, wakeup, stopping, thread
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", stores the task functions. The planner starts with "start".
+#
+# "start": Starts the planner thread, which runs the tasks at once and then when due.
+#
+# "replan": Wakes the planner to work out the next due time again.
+#
+# "stop": Stops the planner thread.
+#
+# "getPlannedTime": Returns the time the planner is sleeping until.
+
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable
+
+class TaskPlanner:
+    # run: runs every task that is due
+    # getNextDueTime: returns the next time a task is due (None if nothing is due)
+    def __init__(self, run: Callable[[], None], getNextDueTime: Callable[[], datetime], maxSleep: float=300):
+        self.run = run
+        self.getNextDueTime = getNextDueTime
+        self.maxSleep = maxSleep
+        self.nextDueTime = None
+        # Set to wake the planner before the next due time
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self._plan, name="TaskPlanner", daemon=True)
+
+    # Start the planner thread
+    def start(self) -> None:
+        self.thread.start()
+
+    # Work out the next due time again, the tasks run if it has been reached
+    # (call whenever the data the due times are worked out from changes)
+    def replan(self) -> None:
+        self.wakeup.set()
+
+    # Stop the planner thread (waits for tasks that are running to finish)
+    def stop(self) -> None:
+        self.stopping = True
+        self.wakeup.set()
+        if (self.thread.is_alive()):
+            self.thread.join()
+
+    # Returns the time the planner will next run the tasks (None if nothing is due)
+    def getPlannedTime(self) -> datetime:
+        return self.nextDueTime
+
+    # Planner thread: run the tasks if they are due, then sleep until the next due time or a change
+    def _plan(self) -> None:
+        # The tasks run once when the planner starts
+        due = True
+        # Set when the tasks fail, they are not run again before then
+        retryTime = None
+        while (not self.stopping):
+            # Cleared before running, so changes made while running wake the planner again
+            self.wakeup.clear()
+            try:
+                if (due):
+                    retryTime = None
+                    self.run()
+                self.nextDueTime = self.getNextDueTime()
+            except Exception:
+                traceback.print_exc()
+                retryTime = datetime.now() + timedelta(seconds=self.maxSleep)
+                self.nextDueTime = retryTime
+            if (retryTime and (self.nextDueTime == None or self.nextDueTime < retryTime)):
+                self.nextDueTime = retryTime
+            timeout = self.maxSleep
+            if (self.nextDueTime):
+                timeout = min(timeout, max(0.0, (self.nextDueTime - datetime.now()).total_seconds()))
+            self.wakeup.wait(timeout)
+            due = (not self.nextDueTime == None and datetime.now() >= self.nextDueTime)
@@ -0,0 +1,72 @@
+#                                     Summary:
+#
+# This class is a token bucket rate limiter. The bucket holds up to capacity tokens and is
+# refilled at a steady rate, each action takes a token, and actions wait when the bucket is
+# empty. A full bucket allows a burst of capacity actions, after which actions are limited
+# to the refill rate.
+#
+#
+#
+#                                     Data Members:
+#
+# rate, capacity, tokens, updated
+#
+#
+#
+#                                      Methods:
+#
+# "init": The class' "constructor", starts with a full bucket.
+#
+# "waitTime": Returns the seconds until a number of tokens are available.
+#
+# "take": Removes tokens from the bucket.
+#
+# "timeFor": Returns the seconds needed to take a number of tokens, waiting for refills.
+#
+# "getLevel": Returns the tokens in the bucket and the (wall clock) time, to be saved.
+#
+# "setLevel": Restores the tokens saved by "getLevel", adding the refills since then.
+
+import time
+from typing import Tuple
+
+class TokenBucket:
+    # rate: tokens added per second, capacity: most tokens the bucket holds
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # Returns seconds until count tokens are in the bucket (0 if they are available now)
+    def waitTime(self, count: float=1) -> float:
+        self._refill()
+        if (self.tokens >= count):
+            return 0.0
+        return (count - self.tokens) / self.rate
+
+    # Remove count tokens (the bucket can go below 0, later actions then wait longer)
+    def take(self, count: float=1) -> None:
+        self._refill()
+        self.tokens = self.tokens - count
+
+    # Returns seconds needed to take count tokens, starting from the tokens in the bucket now
+    def timeFor(self, count: float) -> float:
+        self._refill()
+        return max(0.0, (count - self.tokens) / self.rate)
+
+    # Returns (tokens in the bucket now, time.time()), the monotonic clock cannot be compared across restarts
+    def getLevel(self) -> Tuple[float, float]:
+        self._refill()
+        return (self.tokens, time.time())
+
+    # Set the tokens to a level returned by getLevel, adding the tokens refilled since it was taken
+    def setLevel(self, tokens: float, savedTime: float) -> None:
+        self.updated = time.monotonic()
+        self.tokens = min(self.capacity, tokens + max(0.0, time.time() - savedTime) * self.rate)
+
+    # Add the tokens refilled since the last update
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
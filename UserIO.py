@@ -15,6 +15,12 @@
 # "loadData": Loads the data of the user from a file to an object stored in the memory.
 #
 # "saveData": Saves the data of the user from an object stored in the memory to a file.
+#
+# "getUser": Returns the user stored in memory that matches a username.
+#
+# "addUser": Adds a new user to memory, then saves to file.
+#
+# "updateUser": Saves the changes made to a user to file.
 
 import os
 from DataIO import DataIO
@@ -75,6 +81,28 @@ class UserIO(DataIO):
                 # Print line to file
                 print(line, file=outFile)
 
+    # Returns the user matching given username (None if not found)
+    def getUser(self, username: str) -> UserData:
+        for user in self.data:
+            if (user.isUsername(username)):
+                return user
+        return None
+
+    # Add new user to memory, then save to file
+    def addUser(self, newUser: UserData) -> None:
+        self.data.append(newUser)
+        self.saveData()
+
+    # Replace matching user in memory (matches by username), then save to file
+    # Returns True if user is replaced
+    def updateUser(self, newUser: UserData) -> bool:
+        for i in range(len(self.data)):
+            if (self.data[i].isUser(newUser)):
+                self.data[i] = newUser
+                self.saveData()
+                return True
+        return False
+
 if __name__=="__main__":
     users = UserIO()
     users.loadData()
@@ -0,0 +1,87 @@
+#                                           Summary:
+# This class stores the user data in the SQLite database. It has the same methods as
+# UserIO, but users are read and written one row at a time instead of holding every user.
+#
+#
+#
+#                                          Data Members:
+#
+# userName, password, phone, email, zip.
+#
+#
+#
+#                                           Methods:
+#
+# "createTables": Creates the users table and its index.
+#
+# "loadData": Nothing to load, users are read one at a time by "getUser".
+#
+# "saveData": Replaces every user in the database with the users in memory.
+#
+# "getUser": Reads a single user from the database.
+#
+# "addUser": Writes a new user to the database.
+#
+# "updateUser": Writes the changes made to a user to the database.
+
+from SQLiteIO import SQLiteIO
+from dataClasses.UserData import UserData
+
+# Data is stored as a list of UserData objects (only used by saveData)
+class UserSQLiteIO(SQLiteIO):
+    # Create table and index if they do not exist
+    # Zip is stored as "" for users without a zip code
+    def createTables(self) -> None:
+        with self.lock:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL,
+                    phone TEXT NOT NULL,
+                    email TEXT NOT NULL,
+                    zip TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS usersUsernameIndex ON users (lower(username));
+            """)
+
+    # Users are read one at a time by getUser, nothing is held in memory
+    def loadData(self) -> None:
+        pass
+
+    # Save User data to database from memory in object (replaces every user)
+    def saveData(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM users")
+            for user in self.data:
+                self._insertUser(user)
+
+    # Returns the user matching given username (None if not found)
+    def getUser(self, username: str) -> UserData:
+        with self.lock:
+            row = self.connection.execute("SELECT username, password, phone, email, zip FROM users WHERE lower(username) = ?", (username.lower(),)).fetchone()
+        if (row == None):
+            return None
+        return UserData(*row)
+
+    # Write new user to database
+    def addUser(self, newUser: UserData) -> None:
+        with self.lock, self.connection:
+            self._insertUser(newUser)
+
+    # Write changes to matching user (matches by username), returns True if user is updated
+    def updateUser(self, user: UserData) -> bool:
+        with self.lock, self.connection:
+            cursor = self.connection.execute("UPDATE users SET password = ?, phone = ?, email = ?, zip = ? WHERE lower(username) = ?",
+                                             (user.getPassword(), user.getPhone(), user.getEmail(), user.getZip(), user.getUsername().lower()))
+        return cursor.rowcount > 0
+
+    # Insert user (must be called inside a transaction)
+    def _insertUser(self, user: UserData) -> None:
+        self.connection.execute("INSERT INTO users (username, password, phone, email, zip) VALUES (?, ?, ?, ?, ?)",
+                                (user.getUsername(), user.getPassword(), user.getPhone(), user.getEmail(), user.getZip()))
+
+if __name__=="__main__":
+    users = UserSQLiteIO()
+    user = users.getUser("user1")
+    if (user):
+        user.printAllData()
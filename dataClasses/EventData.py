@@ -1,8 +1,11 @@
 # Event Data: Stores the data for one event
+import itertools
+import sys
 from datetime import date, datetime, timedelta
 from dateutil import relativedelta
 from pytz import timezone
-from typing import List
+from typing import Dict, List, Tuple
+from dataClasses.extras import TAG_BITS
 
 # Calculates offset between Central Time and UTC
 # Time is stored as a datetime object in UTC
@@ -12,7 +15,24 @@ def setOffset() -> timedelta:
     centralTime = centralTime.astimezone(timezone("US/Central"))
     return centralTime.utcoffset()
 
+# Version numbers given to events (see EventData.getVersion)
+eventVersions = itertools.count(1)
+
+# Converts a list of tags to a bitmask using TAG_BITS
+# Returns None if a tag is not one of the valid tags
+def tagsToMask(tags: List[str]) -> int:
+    mask = 0
+    for tag in tags:
+        if (not tag in TAG_BITS):
+            return None
+        mask = mask | TAG_BITS[tag]
+    return mask
+
 class EventData:
+    # Fixed attribute slots instead of a __dict__ per event
+    __slots__ = ("name", "date", "organizer", "recurring", "time", "location", "zip", "tags", "RSVP", "summary",
+                 "dateStr", "timeStr", "tagStrs", "tagMask", "sortKey", "expiry", "version")
+
     # For use converting Central Time to UTC
     CentralOffset = setOffset()
     
@@ -20,15 +40,12 @@ class EventData:
     def getName(self) -> str:
         return self.name
 
+    # Date, time and tag strings are formatted once when the event is built or edited
     def getTimeStr(self) -> str:
-        if (self.time == "TBD"):
-            return self.time
-        else:
-            time = self.time + self.CentralOffset
-            return time.strftime("%H:%M")
+        return self.timeStr
 
     def getDateStr(self) -> str:
-        return self.date.strftime("%Y-%m-%d")
+        return self.dateStr
 
     def getLocation(self) -> str:
         return self.location
@@ -37,14 +54,18 @@ class EventData:
         return self.zip
         
     def getTagStrs(self) -> List[str]:
-        tags = [entry.replace('_', ' ') for entry in self.tags]
-        return tags
+        return self.tagStrs
+
+    # Returns bitmask of the object's valid tags (other tags such as "No Tags" are not included)
+    def getTagMask(self) -> int:
+        return self.tagMask
 
     def getOrganizer(self) -> str:
         return self.organizer
 
+    # RSVP usernames in the order they joined
     def getRSVP(self) -> List[str]:
-        return self.RSVP
+        return list(self.RSVP)
     
     def getRSVPNum(self) -> int:
         return len(self.RSVP)
@@ -54,6 +75,21 @@ class EventData:
     
     def getRecurring(self) -> str:
         return self.recurring
+
+    # Returns (date, time, name) strings, the order events are sorted in
+    # Use as the key when sorting events (list.sort(key=EventData.getSortKey))
+    def getSortKey(self) -> Tuple[str, str, str]:
+        return self.sortKey
+
+    # Returns the date and time (UTC) the event stops being active
+    # Returns None for events without a time, these are never retired
+    def getExpiry(self) -> datetime:
+        return self.expiry
+
+    # Returns a number that changes whenever the event is changed
+    # Numbers are never reused, even by other events, so (name, version) identifies the event's current data
+    def getVersion(self) -> int:
+        return self.version
     
     # Set methods for optional data stored in object
     # Used when editing events
@@ -61,18 +97,25 @@ class EventData:
     def setTime(self, newCentralTime: str) -> None:
         centralTime = datetime.strptime(newCentralTime, "%H:%M")
         self.time = centralTime - self.CentralOffset
+        self._setTimeData()
+        self._newVersion()
 
     def setLocation(self, newLocation: str) -> None:
         self.location = newLocation
+        self._newVersion()
 
     def setZip(self, newZip: str) -> None:
-        self.zip = newZip
+        self.zip = sys.intern(newZip)
+        self._newVersion()
 
     def setTags(self, newTags: str) -> None:
-        self.tags = newTags
+        self.tags = [sys.intern(tag) for tag in newTags]
+        self._setTagData()
+        self._newVersion()
 
     def setSummary(self, newSummary: str) -> None:
         self.summary = newSummary
+        self._newVersion()
     
     def resetOptional(self) -> None:
         self.time = "TBD"
@@ -80,6 +123,32 @@ class EventData:
         self.zip = "TBD"
         self.tags = ["No Tags"]
         self.summary = "No Summary"
+        self._setTimeData()
+        self._setTagData()
+        self._newVersion()
+
+    # Gives the object a new version number (called by every method that changes the object)
+    def _newVersion(self) -> None:
+        self.version = next(eventVersions)
+
+    # Recalculates the time string, sort key and expiry from the object's date and time
+    def _setTimeData(self) -> None:
+        if (self.time == "TBD"):
+            self.timeStr = self.time
+            self.expiry = None
+        else:
+            self.timeStr = sys.intern((self.time + self.CentralOffset).strftime("%H:%M"))
+            # Time is stored on 1900-01-01, or the next day if Central Time to UTC passed midnight
+            self.expiry = datetime.combine(self.date, datetime.min.time()) + (self.time - datetime(1900, 1, 1))
+        self.sortKey = (self.dateStr, self.timeStr, self.name)
+
+    # Recalculates the tag strings and tag mask from the object's tag list
+    def _setTagData(self) -> None:
+        self.tagStrs = [sys.intern(entry.replace('_', ' ')) for entry in self.tags]
+        self.tagMask = 0
+        for tag in self.tags:
+            if (tag in TAG_BITS):
+                self.tagMask = self.tagMask | TAG_BITS[tag]
     
     # Returns True if given event name matches the object's name
     def isEventname(self, otherName: str) -> bool:
@@ -107,7 +176,6 @@ class EventData:
     def isNextWeek(self) -> bool:
         today = datetime.today().date()
         oneWeek = today + relativedelta.relativedelta(weeks=1)
-        return True
         return (today < self.date < oneWeek)
         
     # Returns True if given username is in the object's RSVP list
@@ -117,21 +185,20 @@ class EventData:
     # Returns True if given tag list is in the object's tag list 
     # (Has all tags, can have more)
     def hasTags(self, tags: List[str]) -> bool:
-        for tag in tags:
-            if (tag not in self.tags):
-                return False
-        return True
+        mask = tagsToMask(tags)
+        if (mask == None):
+            for tag in tags:
+                if (tag not in self.tags):
+                    return False
+            return True
+        return self.tagMask & mask == mask
 
-    # Returns True if the object's date is on or after the current date and time
+    # Returns True if the object's date and time is after the current date and time
     def isActive(self) -> bool:
-        now = datetime.now() - self.CentralOffset
-        today = now.date()
-        if (today < self.date):
+        expiry = self.getExpiry()
+        if (expiry == None):
             return True
-        elif (self.time == "TBD"):
-            return True
-        else:
-            return self.time.time() < now.time()
+        return datetime.now() - self.CentralOffset < expiry
     
     # Returns True if the object is a recurring event
     def isRecurring(self):
@@ -149,7 +216,8 @@ class EventData:
         if username in self.RSVP:
             return False
         else:
-            self.RSVP.append(username)
+            self.RSVP[sys.intern(username)] = None
+            self._newVersion()
             return True
     
     # Remove user from RSVP list (Returns True if successful)
@@ -157,12 +225,13 @@ class EventData:
         if not user in self.RSVP:
             return False
         else:
-            self.RSVP.remove(user)
+            del self.RSVP[user]
+            self._newVersion()
             return True
 
     # Printing for debugging
     def printAllData(self) -> None:
-        print(f"Event: {self.name}\n  Date: {self.getDateStr()}\n  Time: {self.getTimeStr()}\n  Location: {self.location}\n  Tags: {self.tags}\n  Organizer: {self.organizer}\n  RSVP List: {self.RSVP}\n")
+        print(f"Event: {self.name}\n  Date: {self.getDateStr()}\n  Time: {self.getTimeStr()}\n  Location: {self.location}\n  Tags: {self.tags}\n  Organizer: {self.organizer}\n  RSVP List: {self.getRSVP()}\n")
     
     def printName(self) -> None:
         print(f"Event: {self.name}")
@@ -244,19 +313,49 @@ EventData.EventBuilder.Summary = EBSummary
 
 # EventData Methods (Moved to allow defining of arguments/return variables)
 def ED__init__(self, builder: EventData.EventBuilder) -> None:
+    self._setFields(builder.name, builder.date, builder.organizer, builder.recurring, builder.time,
+                    builder.location, builder.zip, builder.tags, builder.rsvp, builder.summary)
+
+# Sets every field, then the formatted strings and sort key
+# Strings repeated across many events (organizer, zip, tags, RSVP usernames, dates and times) are interned
+def ED_setFields(self: EventData, name: str, date: date, organizer: str, recurring: str, time: datetime,
+                 location: str, zip: str, tags: List[str], rsvp: List[str], summary: str) -> None:
     # Required Fields
-    self.name = builder.name
-    self.date = builder.date
-    self.organizer = builder.organizer
-    self.recurring = builder.recurring
+    self.name = name
+    self.date = date
+    self.organizer = sys.intern(organizer)
+    self.recurring = sys.intern(recurring)
 
     # Optional Fields
-    self.time = builder.time
-    self.location = builder.location
-    self.zip = builder.zip
-    self.tags = builder.tags
-    self.RSVP = builder.rsvp
-    self.summary = builder.summary
+    self.time = time
+    self.location = location
+    self.zip = sys.intern(zip)
+    self.tags = [sys.intern(tag) for tag in tags]
+    # RSVP is a dict used as an ordered set (username -> None), keeping join order with O(1) lookup and removal
+    self.RSVP: Dict[str, None] = dict.fromkeys([sys.intern(username) for username in rsvp])
+    self.summary = summary
+
+    # Formatted strings and sort key
+    self.dateStr = sys.intern(self.date.strftime("%Y-%m-%d"))
+    self._setTimeData()
+    self._setTagData()
+    self._newVersion()
+
+# Builds an event from strings read from the database without creating an EventBuilder
+# Accepts the same values as the EventBuilder methods
+def EDfromFields(cls, name: str, dateStr: str, timeStr: str, location: str, zip: str, recurring: str,
+                 tags: List[str], organizer: str, rsvp: List[str], summary: str) -> EventData:
+    if (timeStr == "TBD" or timeStr == ""):
+        time = "TBD"
+    else:
+        hour, minute = timeStr.split(':')
+        time = datetime(1900, 1, 1, int(hour), int(minute)) - EventData.CentralOffset
+    if (tags == []):
+        tags = ["No Tags"]
+    event = cls.__new__(cls)
+    event._setFields(name, date.fromisoformat(dateStr), organizer, recurring, time,
+                     location or "TBD", zip or "TBD", tags, rsvp, summary)
+    return event
 
 # Returns True if given event matches the object's name
 def EDisEvent(self, otherEvent: EventData) -> bool:
@@ -292,11 +391,13 @@ def EDgetNextRecurringEvent(self: EventData) -> EventData:
 
 # Defines less than operator for EventData objects
 # Defined to compare dates first, then times, then names
-# Used in sorting list of events
+# Sorting with key=EventData.getSortKey compares the same keys without calling this per comparison
 def ED__lt__(self, other: EventData) -> bool:
-    return (self.date, self.getTimeStr(), self.name) < (other.date, self.getTimeStr(), other.name)
+    return self.sortKey < other.sortKey
 
 EventData.__init__ = ED__init__
+EventData._setFields = ED_setFields
+EventData.fromFields = classmethod(EDfromFields)
 EventData.getNextRecurringEvent = EDgetNextRecurringEvent
 EventData.isEvent = EDisEvent
 EventData.__lt__ = ED__lt__
@@ -1,12 +1,17 @@
 # User Data: Stores the data for one user
+import sys
 
 class UserData:
+    # Fixed attribute slots instead of a __dict__ per user
+    __slots__ = ("username", "password", "phone", "email", "zip")
+
+    # Username and zip are interned (shared with the events' organizer, RSVP and zip strings)
     def __init__(self, newUsername: str, newPassword: str, newPhone: str, newEmail: str, newZip: str=""):
-        self.username = newUsername
+        self.username = sys.intern(newUsername)
         self.password = newPassword
         self.phone = newPhone
         self.email = newEmail
-        self.zip = newZip
+        self.zip = sys.intern(newZip)
     
     # Get methods for data in object
     def getUsername(self) -> str:
@@ -32,7 +37,7 @@ class UserData:
         self.email = newEmail
     
     def setZip(self, newZip) -> None:
-        self.zip = newZip
+        self.zip = sys.intern(newZip)
     
     # Returns True if given username matches the object's username
     def isUsername(self, otherUsername: str) -> bool:
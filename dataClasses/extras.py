@@ -11,9 +11,58 @@ DISPLAY_TAGS = [entry.replace('_', ' ') for entry in VALID_TAGS]
 
 NUM_TAGS = len(VALID_TAGS)
 
+# Bit used for each valid tag in an event's tag mask
+TAG_BITS = {tag: 1 << i for i, tag in enumerate(VALID_TAGS)}
+
 DATABASE_PATH = "static/"
 IMAGE_PATH = "images/"
 USER_IMAGES = IMAGE_PATH + "users/"
 EVENT_IMAGES = IMAGE_PATH + "events/"
 STATIC_PATH = "static/"
-CSS_PATH = "css/"
\ No newline at end of file
+CSS_PATH = "css/"
+
+# Number of archived events shown on each page of the event archive
+ARCHIVE_PAGE_SIZE = 30
+
+# Number of popular events shown on the home page
+POPULAR_EVENT_COUNT = 3
+
+# Number of rendered event cards kept by HTMLPages (least recently used cards are removed first)
+CARD_CACHE_SIZE = 5000
+
+# Stylesheet linked from every page, served under its hashed name (see AssetManifest)
+STYLESHEET = CSS_PATH + "style.css"
+
+# How long browsers may keep hashed static files (1 year, the files never change)
+ASSET_MAX_AGE = 31536000
+
+# File (in each image folder) the image manifest is saved to, see ImageManifest
+# None reads the image folders once at startup instead
+IMAGE_MANIFEST_FILE = None
+
+# Number of whole pages kept by FlaskWebsite's response cache (least recently used pages are removed first)
+RESPONSE_CACHE_SIZE = 500
+
+# Attempts made to deliver an email before it is moved to the outbox's dead letter folder, see EmailOutbox
+EMAIL_MAX_ATTEMPTS = 8
+
+# Seconds before the first retry of a failed email, doubled after each failed attempt up to EMAIL_MAX_RETRY_DELAY
+EMAIL_RETRY_DELAY = 30
+EMAIL_MAX_RETRY_DELAY = 3600
+
+# Most emails sent per second and per day, set below the mail server's limits (None for no limit)
+# See SendScheduler, the outbox's workers send as fast as these allow
+EMAIL_PER_SECOND = 5
+EMAIL_PER_DAY = 2000
+
+# True sends each user one email listing all of their one day and one week reminders
+# False sends a separate reminder email for each event
+EMAIL_DIGEST = True
+
+# Most seconds the task planner sleeps before checking the due times again, see TaskPlanner
+# (the longest timed tasks can be late if the system clock changes)
+PLANNER_MAX_SLEEP = 300
+
+# Storage used for events and users: "text" (database/*.txt files) or "sqlite" (database/Database.db)
+# Run MigrateToSQLite.py once before switching an existing database to "sqlite"
+STORAGE_BACKEND = "text"
\ No newline at end of file